@@ -1,23 +1,25 @@
-from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
-
-from bot.handlers import setup_routers as setup_bot
-from api import setup_routers as setup_api
+import sys
 
-from config_reader import config, dp, app
+import uvicorn
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-    expose_headers=["*"]
-)
+from config_reader import config
 
-dp.include_router(setup_bot())
-app.include_router(setup_api())
 
 if __name__ == "__main__":
-    uvicorn.run(app, host=config.APP_HOST, port=config.APP_PORT)
-    
\ No newline at end of file
+    # WebSocket delivery, presence, the response and auth caches, the update
+    # queue and notification rate limits all live in process memory. Until
+    # they have a shared backend, extra workers would each see only part of
+    # that state, so scale out with one worker per instance instead.
+    if config.APP_WORKERS > 1:
+        sys.exit("APP_WORKERS > 1 is not supported yet: realtime, presence, caches and rate limits are per process")
+
+    uvicorn.run(
+        "server:create_app",
+        factory=True,
+        host=config.APP_HOST,
+        port=config.APP_PORT,
+        loop=config.APP_LOOP,
+        http=config.APP_HTTP,
+        # Requests are logged by RequestLogMiddleware, with sampling.
+        access_log=False
+    )
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from . import common, users, adverts, chats
+from . import common, users, adverts, chats, realtime, sync
 
 def setup_routers() -> APIRouter:
     router = APIRouter()
@@ -9,4 +9,6 @@ def setup_routers() -> APIRouter:
     router.include_router(users.router)
     router.include_router(adverts.router)
     router.include_router(chats.router)
+    router.include_router(realtime.router)
+    router.include_router(sync.router)
     return router
\ No newline at end of file
@@ -1,56 +1,235 @@
-from fastapi import APIRouter, Request
-from fastapi.responses import JSONResponse
-from datetime import datetime
-from db import AdvertSchema, Advert, User, UserSchema
+from aiogram.utils.web_app import WebAppInitData
+from fastapi import APIRouter, Request, Depends
+from fastapi.responses import Response
+from contextlib import nullcontext
+from datetime import date
+from tortoise.exceptions import DoesNotExist
+from tortoise.transactions import in_transaction
+from typing import Any, Awaitable, Callable, Dict, Iterable
+from config_reader import config
+from db import Advert, Booking
+from db.routing import replica_reads, use_primary
+from services.auth import user_cache
+from services.cache import advert_cache, etag_matches
+from services.counters import adjust_counter
+from services.facets import add_to_facets, facet_key, load_facets, remove_from_facets, update_facets
+from services.geo import NearbyQuery, geo_cell, overlapping, parse_coordinates, parse_date_range
+from services.catalog import ListingQuery
+from services.search import advert_search, SEARCH_PAGE_SIZE, SEARCH_PAGE_MAX
+from services.serialization import FastJSONResponse, FieldPlan
+from services.sync import ADVERT, record_change
+from .utils import auth, is_caller
 
-router = APIRouter(prefix="/api/advert")
+router = APIRouter(prefix="/api/advert", dependencies=[Depends(auth)])
 
-def serialize_advert(advert):
-    data = advert.model_dump()
-    
-    for key, value in data.items():
-        if isinstance(value, datetime):
-            data[key] = value.isoformat()
+LISTINGS_TAG = "listings"
+
+advert_plan = FieldPlan(Advert, exclude=("geo_cell",))
+booking_plan = FieldPlan(Booking)
+
+FORBIDDEN = {"error": "Forbidden"}
+
+
+def advert_tag(advert_id: int) -> str:
+    return f"advert:{advert_id}"
+
+
+def owner_tag(owner_id: int) -> str:
+    return f"owner:{owner_id}"
+
+
+def invalidate_advert(advert: Advert) -> None:
+    advert_cache.invalidate(LISTINGS_TAG, advert_tag(advert.id), owner_tag(advert.owner_id))
+
+
+def apply_location(advert: Advert, data: Dict[str, Any]) -> None:
+    if data.get("latitude") is None and data.get("longitude") is None:
+        advert.latitude = advert.longitude = advert.geo_cell = None
+        return
+    advert.latitude, advert.longitude = parse_coordinates(data.get("latitude"), data.get("longitude"))
+    advert.geo_cell = geo_cell(advert.latitude, advert.longitude)
+
+
+async def cached_json(
+    request: Request,
+    key: str,
+    tags: Iterable[str],
+    build: Callable[[], Awaitable[Dict[str, Any]]]
+) -> Response:
+    entry = advert_cache.get(key)
+    if entry is None:
+        generation = advert_cache.generation
+        # Right after a write the replica may still lag behind, and whatever
+        # we read now stays cached for the whole TTL.
+        fresh = use_primary() if advert_cache.invalidated_within(config.DB_REPLICA_LAG) else nullcontext()
+        with fresh:
+            content = await build()
+        entry = advert_cache.put(key, content, tags, generation)
+
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(entry.etag, request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+def serialize_advert(advert: Advert) -> Dict[str, Any]:
+    return advert_plan.dump(advert)
+
+@router.get("/get/all", dependencies=[Depends(replica_reads)])
+async def get_all_adverts(request: Request) -> Response:
+    try:
+        query = ListingQuery.from_params(request.query_params)
+    except ValueError as e:
+        return FastJSONResponse({"error": str(e)}, status_code=400)
     
-    return data
+    async def build() -> Dict[str, Any]:
+        rows = await query.queryset().values(*advert_plan.fields)
+        page, next_cursor = query.paginate(rows)
+        return {
+            "adverts": page,
+            "next_cursor": next_cursor
+        }
+
+    tags = [LISTINGS_TAG]
+    if query.owner_id is not None:
+        tags.append(owner_tag(query.owner_id))
+    try:
+        return await cached_json(request, f"list:{query!r}", tags, build)
+    except ValueError as e:
+        return FastJSONResponse({"error": str(e)}, status_code=400)
 
-@router.get("/get/all")
-async def get_all_adverts(request: Request) -> JSONResponse:
-    objs = await AdvertSchema.from_queryset(Advert.all())
-    return JSONResponse({
-        "adverts": [serialize_advert(obj) for obj in objs]
+@router.get("/search", dependencies=[Depends(replica_reads)])
+async def search_adverts(request: Request, q: str = "", page: int = 0, limit: int = SEARCH_PAGE_SIZE) -> FastJSONResponse:
+    if not q.strip():
+        return FastJSONResponse({"error": "q parameter is required"}, status_code=400)
+    
+    limit = max(1, min(limit, SEARCH_PAGE_MAX))
+    page = max(page, 0)
+    
+    ids, has_more = await advert_search.search(q, page * limit, limit)
+    rows = await Advert.filter(id__in=ids).values(*advert_plan.fields)
+    by_id = {row["id"]: row for row in rows}
+    
+    return FastJSONResponse({
+        "adverts": [by_id[advert_id] for advert_id in ids if advert_id in by_id],
+        "next_page": page + 1 if has_more else None
     })
 
-@router.get("/get/{advert_id}")
-async def get_advert(request: Request, advert_id: int) -> JSONResponse:
+@router.get("/nearby", dependencies=[Depends(replica_reads)])
+async def get_nearby_adverts(request: Request) -> FastJSONResponse:
+    try:
+        query = NearbyQuery.from_params(request.query_params)
+    except ValueError as e:
+        return FastJSONResponse({"error": str(e)}, status_code=400)
+
+    return FastJSONResponse({"adverts": await query.run(advert_plan.fields)})
+
+
+@router.get("/facets", dependencies=[Depends(replica_reads)])
+async def get_facets(request: Request) -> Response:
+    # Served from category_facets, which the write paths below keep up to
+    # date, so the cost does not grow with the number of adverts.
+    return await cached_json(request, "facets", [LISTINGS_TAG], load_facets)
+
+@router.get("/{advert_id}/bookings", dependencies=[Depends(replica_reads)])
+async def get_bookings(advert_id: int) -> FastJSONResponse:
+    bookings = await Booking.filter(advert_id=advert_id, ends_on__gte=date.today()).order_by("starts_on")
+    return FastJSONResponse({"bookings": booking_plan.dump_many(bookings)})
+
+
+@router.post("/{advert_id}/bookings")
+async def create_booking(
+    advert_id: int,
+    request: Request,
+    auth_data: WebAppInitData = Depends(auth)
+) -> FastJSONResponse:
     try:
-        obj = await AdvertSchema.from_tortoise_orm(await Advert.get(id=advert_id))
-        return JSONResponse({"advert": serialize_advert(obj)})
-    except Advert.DoesNotExist:
-        return JSONResponse({"error": "Advert not found"}, status_code=404)
+        data = await request.json()
+        if not is_caller(auth_data, data.get("user_id")):
+            return FastJSONResponse(FORBIDDEN, status_code=403)
+        starts_on, ends_on = parse_date_range(data.get("starts_on"), data.get("ends_on"))
+
+        async with in_transaction("default"):
+            # Locks the advert row on Postgres so two overlapping requests
+            # cannot both pass the check below.
+            advert = await Advert.filter(id=advert_id).select_for_update().first()
+            if advert is None:
+                raise DoesNotExist(f"Advert {advert_id} not found")
+            if await Booking.filter(overlapping(starts_on, ends_on), advert_id=advert_id).exists():
+                return FastJSONResponse({"error": "Dates are already booked"}, status_code=409)
+            booking = await Booking.create(
+                advert_id=advert_id,
+                user_id=data.get("user_id"),
+                starts_on=starts_on,
+                ends_on=ends_on
+            )
+
+        return FastJSONResponse({"booking": booking_plan.dump(booking)}, status_code=201)
+
+    except DoesNotExist:
+        return FastJSONResponse({"error": "Advert not found"}, status_code=404)
+    except ValueError as e:
+        return FastJSONResponse({"error": str(e)}, status_code=400)
+
+
+@router.delete("/{advert_id}/bookings/{booking_id}")
+async def delete_booking(
+    advert_id: int,
+    booking_id: int,
+    auth_data: WebAppInitData = Depends(auth)
+) -> FastJSONResponse:
+    booking = await Booking.filter(id=booking_id, advert_id=advert_id).first()
+    if booking is None:
+        return FastJSONResponse({"error": "Booking not found"}, status_code=404)
+    # Either the guest or the owner of the advert may cancel a booking.
+    if not is_caller(auth_data, booking.user_id):
+        owner_id = await Advert.filter(id=advert_id).first().values_list("owner_id", flat=True)
+        if not is_caller(auth_data, owner_id):
+            return FastJSONResponse(FORBIDDEN, status_code=403)
+    await booking.delete()
+    return FastJSONResponse({"deleted_id": booking_id})
+
 
-@router.get("/get/user-adverts")
-async def get_user_adverts(request: Request) -> JSONResponse:
+@router.get("/get/user-adverts", dependencies=[Depends(replica_reads)])
+async def get_user_adverts(request: Request) -> Response:
     owner_id = request.query_params.get("owner_id")
     
     if not owner_id:
-        return JSONResponse({"error": "owner_id parameter is required"}, status_code=400)
+        return FastJSONResponse({"error": "owner_id parameter is required"}, status_code=400)
     
     try:
-        adverts = await AdvertSchema.from_queryset(
-            Advert.filter(owner_id=int(owner_id)).order_by("-created_at")
-        )
-        return JSONResponse({
-            "adverts": [serialize_advert(advert) for advert in adverts]
-        })
+        owner_id = int(owner_id)
     except ValueError:
-        return JSONResponse({"error": "Invalid owner_id format"}, status_code=400)
+        return FastJSONResponse({"error": "Invalid owner_id format"}, status_code=400)
+
+    async def build() -> Dict[str, Any]:
+        adverts = await Advert.filter(owner_id=owner_id).order_by("-created_at").values(*advert_plan.fields)
+        return {
+            "adverts": adverts
+        }
+
+    return await cached_json(request, f"owner:{owner_id}", [owner_tag(owner_id)], build)
+
+@router.get("/get/{advert_id}", dependencies=[Depends(replica_reads)])
+async def get_advert(request: Request, advert_id: int) -> Response:
+    async def build() -> Dict[str, Any]:
+        return {"advert": serialize_advert(await Advert.get(id=advert_id))}
+
+    try:
+        return await cached_json(request, f"advert:{advert_id}", [advert_tag(advert_id)], build)
+    except DoesNotExist:
+        return FastJSONResponse({"error": "Advert not found"}, status_code=404)
+
+@router.get("/cache/stats")
+async def get_cache_stats(request: Request) -> FastJSONResponse:
+    return FastJSONResponse({"cache": advert_cache.stats()})
 
 @router.post("/create")
-async def create_advert(request: Request) -> JSONResponse:
+async def create_advert(request: Request, auth_data: WebAppInitData = Depends(auth)) -> FastJSONResponse:
     try:
         data = await request.json()
         owner_id = data.get("owner_id")
+        if not is_caller(auth_data, owner_id):
+            return FastJSONResponse(FORBIDDEN, status_code=403)
         
         advert = Advert(
             owner_id=owner_id,
@@ -63,49 +242,71 @@ async def create_advert(request: Request) -> JSONResponse:
             category=data.get("category"),
             available=data.get("available", True)
         )
-        await advert.save()
+        if "latitude" in data or "longitude" in data:
+            apply_location(advert, data)
+        async with in_transaction("default"):
+            await advert.save()
+            if not await adjust_counter(owner_id, "adverts", 1):
+                raise DoesNotExist(f"User {owner_id} not found")
+            await add_to_facets(facet_key(advert))
+            await record_change(ADVERT, advert.id)
 
-        user = await User.get(id=owner_id)
-        user.adverts += 1
-        await user.save()
-        
-        advert_obj = await AdvertSchema.from_tortoise_orm(advert)
+        advert_search.index(advert)
+        invalidate_advert(advert)
+        user_cache.invalidate(owner_id)
         
-        return JSONResponse({
+        return FastJSONResponse({
             "message": "Advert created successfully", 
-            "advert": serialize_advert(advert_obj)
+            "advert": serialize_advert(advert)
         }, status_code=201)
         
     except Exception as e:
-        return JSONResponse({"error": str(e)}, status_code=400)
+        return FastJSONResponse({"error": str(e)}, status_code=400)
 
 @router.delete("/delete")
-async def delete_advert(request: Request) -> JSONResponse:
+async def delete_advert(request: Request, auth_data: WebAppInitData = Depends(auth)) -> FastJSONResponse:
     advert_id = request.query_params.get("id")
     
     if not advert_id:
-        return JSONResponse({"error": "ID parameter is required"}, status_code=400)
+        return FastJSONResponse({"error": "ID parameter is required"}, status_code=400)
     
     try:
         advert = await Advert.get(id=int(advert_id))
-        await advert.delete()
+        if not is_caller(auth_data, advert.owner_id):
+            return FastJSONResponse(FORBIDDEN, status_code=403)
+        async with in_transaction("default"):
+            await advert.delete()
+            await adjust_counter(advert.owner_id, "adverts", -1)
+            await remove_from_facets(facet_key(advert))
+            await record_change(ADVERT, advert.id, deleted=True)
+
+        advert_search.unindex(advert.id)
+        invalidate_advert(advert)
+        user_cache.invalidate(advert.owner_id)
         
-        return JSONResponse({
+        return FastJSONResponse({
             "message": "Advert deleted successfully",
             "deleted_id": advert_id
         })
         
-    except Advert.DoesNotExist:
-        return JSONResponse({"error": "Advert not found"}, status_code=404)
+    except DoesNotExist:
+        return FastJSONResponse({"error": "Advert not found"}, status_code=404)
     except ValueError:
-        return JSONResponse({"error": "Invalid ID format"}, status_code=400)
+        return FastJSONResponse({"error": "Invalid ID format"}, status_code=400)
 
 @router.put("/update/{advert_id}")
-async def update_advert(advert_id: int, request: Request) -> JSONResponse:
+async def update_advert(
+    advert_id: int,
+    request: Request,
+    auth_data: WebAppInitData = Depends(auth)
+) -> FastJSONResponse:
     try:
         data = await request.json()
         
         advert = await Advert.get(id=advert_id)
+        if not is_caller(auth_data, advert.owner_id):
+            return FastJSONResponse(FORBIDDEN, status_code=403)
+        before = facet_key(advert)
         
         update_data = {}
         allowed_fields = ["title", "description", "price", "period", "deposit", "category", "available"]
@@ -113,17 +314,23 @@ async def update_advert(advert_id: int, request: Request) -> JSONResponse:
         for field in allowed_fields:
             if field in data:
                 setattr(advert, field, data[field])
+        if "latitude" in data or "longitude" in data:
+            apply_location(advert, data)
         
-        await advert.save()
-        
-        advert_obj = await AdvertSchema.from_tortoise_orm(advert)
+        async with in_transaction("default"):
+            await advert.save()
+            await update_facets(before, facet_key(advert))
+            await record_change(ADVERT, advert.id)
+
+        advert_search.index(advert)
+        invalidate_advert(advert)
         
-        return JSONResponse({
+        return FastJSONResponse({
             "message": "Advert updated successfully",
-            "advert": serialize_advert(advert_obj)
+            "advert": serialize_advert(advert)
         })
         
-    except Advert.DoesNotExist:
-        return JSONResponse({"error": "Advert not found"}, status_code=404)
+    except DoesNotExist:
+        return FastJSONResponse({"error": "Advert not found"}, status_code=404)
     except Exception as e:
-        return JSONResponse({"error": str(e)}, status_code=400)
\ No newline at end of file
+        return FastJSONResponse({"error": str(e)}, status_code=400)
\ No newline at end of file
@@ -1,14 +1,41 @@
-from fastapi import APIRouter
+from aiogram.utils.web_app import WebAppInitData
+from fastapi import APIRouter, Depends
+from tortoise import BaseDBAsyncClient, timezone
 from tortoise.expressions import Q
-from fastapi.responses import JSONResponse
+from tortoise.queryset import QuerySet
+from tortoise.transactions import in_transaction
 
-from db import Chat, Message, UserStatus, ChatSchema, MessageSchema
-from typing import List, Dict, Any
+from db import Change, Chat, Message, UserStatus, ChatSummary
+from db.routing import replica_reads, use_primary
+from db.summaries import create_summaries, record_message, record_messages, reset_unread, recount_unread, rebuild_summaries
+from services.archive import archived_messages
+from services.notifications import notifier
+from services.realtime import hub
+from services.presence import Presence, presence
+from services.serialization import FastJSONResponse, hhmm
+from services.sync import CHAT, MESSAGE, record_change, record_changes, record_read
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Union
 
-router = APIRouter(prefix="/api")
+from .utils import auth, is_caller, own_user
 
+router = APIRouter(prefix="/api", dependencies=[Depends(auth)])
 
-def serialize_chat(chat_obj: ChatSchema, current_user_id: int) -> Dict[str, Any]:
+MESSAGES_PAGE_SIZE = 50
+MESSAGES_PAGE_MAX = 200
+MESSAGES_BATCH_MAX = 100
+MARK_READ_BATCH_MAX = 200
+NOTIFY_PREVIEW_LENGTH = 200
+
+
+def forbidden() -> FastJSONResponse:
+    return FastJSONResponse({
+        "success": False,
+        "error": "Нет доступа"
+    }, status_code=403)
+
+
+def serialize_chat(chat_obj: Chat, current_user_id: int) -> Dict[str, Any]:
     if chat_obj.user1_id == current_user_id:
         partner_name = chat_obj.user2_name
         partner_id = chat_obj.user2_id
@@ -21,108 +48,254 @@ def serialize_chat(chat_obj: ChatSchema, current_user_id: int) -> Dict[str, Any]
         "name": partner_name,
         "partner_id": partner_id,
         "advert_id": chat_obj.advert_id,
-        "created_at": chat_obj.created_at.isoformat() if hasattr(chat_obj.created_at, 'isoformat') else str(chat_obj.created_at),
+        "created_at": chat_obj.created_at,
         "user1_id": chat_obj.user1_id,
         "user2_id": chat_obj.user2_id
     }
 
 
-def serialize_message(message_obj: MessageSchema, current_user_id: int) -> Dict[str, Any]:
+def serialize_message(message_obj: Message, current_user_id: int) -> Dict[str, Any]:
+    created_at = message_obj.created_at
     return {
         "id": message_obj.id,
         "chat_id": message_obj.chat_id,
         "text": message_obj.text,
-        "timestamp": message_obj.created_at.strftime("%H:%M") if hasattr(message_obj.created_at, 'strftime') else "00:00",
+        "timestamp": hhmm(created_at) if created_at is not None else "00:00",
         "is_own": message_obj.sender_id == current_user_id,
         "read": message_obj.read,
         "sender_id": message_obj.sender_id,
-        "created_at": message_obj.created_at.isoformat() if hasattr(message_obj.created_at, 'isoformat') else str(message_obj.created_at)
+        "created_at": created_at
     }
 
 
-def serialize_user_status(status_obj) -> Dict[str, Any]:
+def serialize_user_status(status_obj: Union[Presence, UserStatus]) -> Dict[str, Any]:
     return {
         "user_id": status_obj.user_id,
         "user_name": status_obj.user_name,
         "online": status_obj.online,
-        "last_seen": status_obj.last_seen.isoformat() if hasattr(status_obj.last_seen, 'isoformat') else str(status_obj.last_seen)
+        "last_seen": status_obj.last_seen
+    }
+
+
+def partner_of(chat: Chat, user_id: int) -> int:
+    return chat.user2_id if chat.user1_id == user_id else chat.user1_id
+
+
+async def publish_message(message: Message, chat: Chat) -> None:
+    for user_id in (chat.user1_id, chat.user2_id):
+        await hub.publish(user_id, {
+            "type": "message",
+            "chat_id": chat.id,
+            "message": serialize_message(message, user_id)
+        })
+
+
+def notify_message(message: Message, chat: Chat) -> None:
+    # Users with the app open already got the message over the websocket.
+    recipient_id = partner_of(chat, message.sender_id)
+    if presence.is_online(recipient_id):
+        return
+    sender_name = chat.user1_name if chat.user1_id == message.sender_id else chat.user2_name
+    notifier.notify(recipient_id, f"{sender_name}: {message.text[:NOTIFY_PREVIEW_LENGTH]}")
+
+
+async def publish_read(chat: Chat, reader_id: int) -> None:
+    await hub.publish(partner_of(chat, reader_id), {
+        "type": "read",
+        "chat_id": chat.id,
+        "reader_id": reader_id
+    })
+
+
+async def publish_presence(user_id: int, online: bool) -> None:
+    rows = await Chat.filter(Q(user1_id=user_id) | Q(user2_id=user_id)).values("user1_id", "user2_id")
+    partner_ids = {
+        row["user2_id"] if row["user1_id"] == user_id else row["user1_id"]
+        for row in rows
     }
+    await hub.publish_many(partner_ids, {
+        "type": "presence",
+        "user_id": user_id,
+        "online": online
+    })
+
+
+presence.add_listener(publish_presence)
+
+
+async def insert_messages(
+    connection: BaseDBAsyncClient,
+    sender_id: int,
+    items: List[Dict[str, Any]]
+) -> List[Message]:
+    # One multi-row INSERT ... RETURNING (Postgres, SQLite 3.35+): bulk_create
+    # doesn't report primary keys, and reading the rows back would also pick
+    # up another batch from the same sender committed meanwhile.
+    created_at = timezone.now()
+    postgres = connection.capabilities.dialect == "postgres"
+    rows = []
+    values: List[Any] = []
+    for item in items:
+        row = [item["chat_id"], sender_id, item["text"], created_at, False]
+        rows.append("(" + ", ".join(
+            f"${len(values) + i}" if postgres else "?" for i in range(1, len(row) + 1)
+        ) + ")")
+        values.extend(row)
+    
+    result = await connection.execute_query_dict(
+        f'INSERT INTO "{Message._meta.db_table}" ("chat_id", "sender_id", "text", "created_at", "read") '
+        f'VALUES {", ".join(rows)} RETURNING "id"',
+        values
+    )
+    # Ids are assigned in VALUES order, but RETURNING rows come in no
+    # guaranteed order.
+    ids = sorted(row["id"] for row in result)
+    return [
+        Message(
+            id=message_id,
+            chat_id=item["chat_id"],
+            sender_id=sender_id,
+            text=item["text"],
+            created_at=created_at,
+            read=False
+        )
+        for message_id, item in zip(ids, items)
+    ]
+
+
+async def build_inbox(user_id: int, chats_qs: QuerySet[Chat]) -> List[Dict[str, Any]]:
+    chats = await chats_qs
+    if not chats:
+        return []
+
+    chat_ids = [chat.id for chat in chats]
+    partner_ids = list({partner_of(chat, user_id) for chat in chats})
+
+    summaries = await ChatSummary.filter(user_id=user_id, chat_id__in=chat_ids)
+    summary_by_chat = {summary.chat_id: summary for summary in summaries}
 
+    missing_ids = [chat_id for chat_id in chat_ids if chat_id not in summary_by_chat]
+    if missing_ids:
+        # A lagging replica would feed the rebuild stale messages and might
+        # not have the rows it just wrote yet.
+        with use_primary():
+            await rebuild_summaries(missing_ids)
+            summaries = await ChatSummary.filter(user_id=user_id, chat_id__in=missing_ids)
+        summary_by_chat.update({summary.chat_id: summary for summary in summaries})
 
-@router.get("/chats/{user_id}")
-async def get_user_chats(user_id: int) -> JSONResponse:
+    online_by_user = presence.lookup(partner_ids)
+
+    serialized_chats = []
+    for chat in chats:
+        chat_data = serialize_chat(chat, user_id)
+
+        summary = summary_by_chat.get(chat.id)
+        if summary and summary.last_message_id:
+            chat_data["last_message"] = summary.last_message_text
+            chat_data["last_message_time"] = hhmm(summary.last_message_at)
+        else:
+            chat_data["last_message"] = "Нет сообщений"
+            chat_data["last_message_time"] = ""
+
+        chat_data["unread_count"] = summary.unread_count if summary else 0
+        chat_data["online"] = online_by_user.get(chat_data["partner_id"], False)
+
+        serialized_chats.append(chat_data)
+
+    return serialized_chats
+
+
+@router.get("/chats/{user_id}", dependencies=[Depends(replica_reads), Depends(own_user)])
+async def get_user_chats(user_id: int) -> FastJSONResponse:
     try:
-        chats = await ChatSchema.from_queryset(
-            Chat.filter(Q(user1_id=user_id) | Q(user2_id=user_id))
+        serialized_chats = await build_inbox(
+            user_id, Chat.filter(Q(user1_id=user_id) | Q(user2_id=user_id))
         )
         
-        serialized_chats = []
-        for chat in chats:
-            chat_data = serialize_chat(chat, user_id)
-            
-            last_message = await Message.filter(chat_id=chat.id).order_by('-created_at').first()
-            if last_message:
-                chat_data["last_message"] = last_message.text
-                chat_data["last_message_time"] = last_message.created_at.strftime("%H:%M")
-            else:
-                chat_data["last_message"] = "Нет сообщений"
-                chat_data["last_message_time"] = ""
-            
-            unread_count = await Message.filter(
-                chat_id=chat.id, 
-                read=False
-            ).exclude(sender_id=user_id).count()
-            chat_data["unread_count"] = unread_count
-            
-            partner_id = chat_data["partner_id"]
-            partner_status = await UserStatus.filter(user_id=partner_id).first()
-            chat_data["online"] = partner_status.online if partner_status else False
-            
-            serialized_chats.append(chat_data)
-        
-        return JSONResponse({
+        return FastJSONResponse({
             "success": True,
             "chats": serialized_chats
         })
         
     except Exception as e:
-        return JSONResponse({
+        return FastJSONResponse({
             "success": False,
             "error": str(e)
         }, status_code=500)
 
 
-@router.get("/chats/{chat_id}/messages/{user_id}")
-async def get_chat_messages(chat_id: int, user_id: int) -> JSONResponse:
+@router.get("/chats/{chat_id}/messages/{user_id}", dependencies=[Depends(replica_reads), Depends(own_user)])
+async def get_chat_messages(
+    chat_id: int,
+    user_id: int,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = MESSAGES_PAGE_SIZE
+) -> FastJSONResponse:
     try:
-        chat_exists = await Chat.filter(
-            Q(id=chat_id, user1_id=user_id) | Q(id=chat_id, user2_id=user_id)
-        ).exists()
-        
-        if not chat_exists:
-            return JSONResponse({
+        # The chat may have been created a moment ago, so check it on the primary.
+        with use_primary():
+            chat = await Chat.filter(
+                Q(id=chat_id, user1_id=user_id) | Q(id=chat_id, user2_id=user_id)
+            ).first()
+        
+        if not chat:
+            return FastJSONResponse({
                 "success": False,
                 "error": "Чат не найден"
             }, status_code=404)
         
-        messages = await MessageSchema.from_queryset(
-            Message.filter(chat_id=chat_id).order_by('created_at')
-        )
+        limit = max(1, min(limit, MESSAGES_PAGE_MAX))
+        messages_qs = Message.filter(chat_id=chat_id)
+        
+        # Only chats the archiver has touched, and only pages reaching below
+        # its watermark, need to look at message_archives.
+        archived_until = chat.archived_until or 0
+        if after_id is not None:
+            messages = []
+            if after_id < archived_until:
+                messages = await archived_messages(chat_id, after_id=after_id, limit=limit + 1)
+            if len(messages) <= limit:
+                start = messages[-1].id if messages else after_id
+                messages += await messages_qs.filter(id__gt=start).order_by('id').limit(limit + 1 - len(messages))
+            has_more = len(messages) > limit
+            messages = messages[:limit]
+            next_cursor = messages[-1].id if has_more else None
+        else:
+            if before_id is not None:
+                messages_qs = messages_qs.filter(id__lt=before_id)
+            messages = (await messages_qs.order_by('-id').limit(limit + 1))[::-1]
+            # Scrolled past the oldest live message: continue in the archive.
+            if len(messages) <= limit and archived_until:
+                end = messages[0].id if messages else before_id
+                messages[:0] = await archived_messages(chat_id, before_id=end, limit=limit + 1 - len(messages))
+            has_more = len(messages) > limit
+            messages = messages[-limit:]
+            next_cursor = messages[0].id if has_more else None
+        
+        async with in_transaction("default"):
+            marked = await Message.filter(
+                chat_id=chat_id, 
+                read=False
+            ).exclude(sender_id=user_id).update(read=True)
+            await reset_unread(chat_id, user_id)
+            if marked:
+                await record_read(chat_id, user_id)
         
-        await Message.filter(
-            chat_id=chat_id, 
-            read=False
-        ).exclude(sender_id=user_id).update(read=True)
+        if marked:
+            await publish_read(chat, user_id)
         
         serialized_messages = [serialize_message(msg, user_id) for msg in messages]
         
-        return JSONResponse({
+        return FastJSONResponse({
             "success": True,
-            "messages": serialized_messages
+            "messages": serialized_messages,
+            "next_cursor": next_cursor,
+            "has_more": has_more
         })
         
     except Exception as e:
-        return JSONResponse({
+        return FastJSONResponse({
             "success": False,
             "error": str(e)
         }, status_code=500)
@@ -130,53 +303,130 @@ async def get_chat_messages(chat_id: int, user_id: int) -> JSONResponse:
 
 @router.post("/messages/send")
 @router.post("/messages/send")
-async def send_message(request: dict) -> JSONResponse:
+async def send_message(request: dict, auth_data: WebAppInitData = Depends(auth)) -> FastJSONResponse:
     try:
         chat_id = request.get("chat_id")
         text = request.get("text")
         sender_id = request.get("sender_id")
         
         if not all([chat_id, text, sender_id]):
-            return JSONResponse({
+            return FastJSONResponse({
                 "success": False,
                 "error": "Необходимы chat_id, text и sender_id"
             }, status_code=400)
         
-        chat_exists = await Chat.filter(
+        if not is_caller(auth_data, sender_id):
+            return forbidden()
+        
+        chat = await Chat.filter(
             Q(id=chat_id, user1_id=sender_id) | Q(id=chat_id, user2_id=sender_id)
-        ).exists()
+        ).first()
         
-        if not chat_exists:
-            return JSONResponse({
+        if not chat:
+            return FastJSONResponse({
                 "success": False,
                 "error": "Чат не найден"
             }, status_code=404)
         
-        message = await Message.create(
-            chat_id=chat_id,
-            sender_id=sender_id,
-            text=text
-        )
+        async with in_transaction("default"):
+            message = await Message.create(
+                chat_id=chat_id,
+                sender_id=sender_id,
+                text=text
+            )
+            await Chat.filter(id=chat_id).update(updated_at=datetime.now())
+            await record_message(message)
+            await record_change(MESSAGE, message.id, chat_id=chat_id)
         
-        from datetime import datetime
-        await Chat.filter(id=chat_id).update(updated_at=datetime.now())
+        await publish_message(message, chat)
+        notify_message(message, chat)
         
-        message_schema = await MessageSchema.from_tortoise_orm(message)
+        return FastJSONResponse({
+            "success": True,
+            "message": serialize_message(message, sender_id)
+        })
         
-        return JSONResponse({
+    except Exception as e:
+        return FastJSONResponse({
+            "success": False,
+            "error": str(e)
+        }, status_code=500)
+
+
+@router.post("/messages/send/batch")
+async def send_messages_batch(request: dict, auth_data: WebAppInitData = Depends(auth)) -> FastJSONResponse:
+    try:
+        sender_id = request.get("sender_id")
+        items = request.get("messages")
+        
+        if not sender_id or not isinstance(items, list) or not items:
+            return FastJSONResponse({
+                "success": False,
+                "error": "Необходимы sender_id и messages"
+            }, status_code=400)
+        
+        if not is_caller(auth_data, sender_id):
+            return forbidden()
+        
+        if len(items) > MESSAGES_BATCH_MAX:
+            return FastJSONResponse({
+                "success": False,
+                "error": f"Не больше {MESSAGES_BATCH_MAX} сообщений за раз"
+            }, status_code=400)
+        
+        chat_ids = {item.get("chat_id") for item in items if isinstance(item, dict)}
+        chats = await Chat.filter(
+            Q(id__in=chat_ids, user1_id=sender_id) | Q(id__in=chat_ids, user2_id=sender_id)
+        )
+        chat_by_id = {chat.id: chat for chat in chats}
+        
+        accepted = []
+        rejected = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or not item.get("chat_id") or not item.get("text"):
+                rejected.append({"index": index, "error": "Необходимы chat_id и text"})
+            elif item["chat_id"] not in chat_by_id:
+                rejected.append({"index": index, "error": "Чат не найден"})
+            else:
+                accepted.append(item)
+        
+        messages = []
+        if accepted:
+            async with in_transaction("default") as connection:
+                messages = await insert_messages(connection, sender_id, accepted)
+                await Chat.filter(id__in=list(chat_by_id)).update(updated_at=datetime.now())
+                await record_messages(messages)
+                await record_changes(
+                    Change(entity=MESSAGE, entity_id=message.id, chat_id=message.chat_id)
+                    for message in messages
+                )
+        
+        for message in messages:
+            await publish_message(message, chat_by_id[message.chat_id])
+            notify_message(message, chat_by_id[message.chat_id])
+        
+        serialized_messages = []
+        for item, message in zip(accepted, messages):
+            data = serialize_message(message, sender_id)
+            if "client_id" in item:
+                data["client_id"] = item["client_id"]
+            serialized_messages.append(data)
+        
+        return FastJSONResponse({
             "success": True,
-            "message": serialize_message(message_schema, sender_id)
+            "messages": serialized_messages,
+            "rejected": rejected
         })
         
     except Exception as e:
-        return JSONResponse({
+        return FastJSONResponse({
             "success": False,
             "error": str(e)
         }, status_code=500)
 
 
 @router.post("/chats/create")
-async def create_chat(request: dict) -> JSONResponse:
+async def create_chat(request: dict, auth_data: WebAppInitData = Depends(auth)) -> FastJSONResponse:
     try:
         advert_id = request.get("advert_id")
         user1_id = request.get("user1_id")
@@ -185,11 +435,14 @@ async def create_chat(request: dict) -> JSONResponse:
         user2_name = request.get("user2_name")
         
         if not all([advert_id, user1_id, user2_id, user1_name, user2_name]):
-            return JSONResponse({
+            return FastJSONResponse({
                 "success": False,
                 "error": "Необходимы advert_id, user1_id, user2_id, user1_name, user2_name"
             }, status_code=400)
         
+        if not (is_caller(auth_data, user1_id) or is_caller(auth_data, user2_id)):
+            return forbidden()
+        
         existing_chat = await Chat.filter(
             advert_id=advert_id,
             user1_id=user1_id,
@@ -197,164 +450,231 @@ async def create_chat(request: dict) -> JSONResponse:
         ).first()
         
         if existing_chat:
-            chat_schema = await ChatSchema.from_tortoise_orm(existing_chat)
-            return JSONResponse({
+            return FastJSONResponse({
                 "success": True,
-                "chat": serialize_chat(chat_schema, user1_id),
+                "chat": serialize_chat(existing_chat, user1_id),
                 "is_new": False
             })
         
-        chat = await Chat.create(
-            advert_id=advert_id,
-            user1_id=user1_id,
-            user2_id=user2_id,
-            user1_name=user1_name,
-            user2_name=user2_name
-        )
+        async with in_transaction("default"):
+            chat = await Chat.create(
+                advert_id=advert_id,
+                user1_id=user1_id,
+                user2_id=user2_id,
+                user1_name=user1_name,
+                user2_name=user2_name
+            )
+            await create_summaries(chat)
+            await record_change(CHAT, chat.id, chat_id=chat.id)
         
-        chat_schema = await ChatSchema.from_tortoise_orm(chat)
+        # The app opens chats with the advert owner as user2.
+        notifier.notify(user2_id, f"{user1_name} хочет арендовать ваше объявление")
         
-        return JSONResponse({
+        return FastJSONResponse({
             "success": True,
-            "chat": serialize_chat(chat_schema, user1_id),
+            "chat": serialize_chat(chat, user1_id),
             "is_new": True
         })
         
     except Exception as e:
-        return JSONResponse({
+        return FastJSONResponse({
             "success": False,
             "error": str(e)
         }, status_code=500)
 
 
-@router.get("/chats/search/{user_id}")
-async def search_chats(user_id: int, query: str = "") -> JSONResponse:
+@router.get("/chats/search/{user_id}", dependencies=[Depends(replica_reads), Depends(own_user)])
+async def search_chats(user_id: int, query: str = "") -> FastJSONResponse:
     try:
         if not query:
             return await get_user_chats(user_id)
         
-        chats = await ChatSchema.from_queryset(
+        serialized_chats = await build_inbox(
+            user_id,
             Chat.filter(
                 Q(user1_id=user_id, user2_name__icontains=query) |
                 Q(user2_id=user_id, user1_name__icontains=query)
             )
         )
         
-        serialized_chats = []
-        for chat in chats:
-            chat_data = serialize_chat(chat, user_id)
-            
-            last_message = await Message.filter(chat_id=chat.id).order_by('-created_at').first()
-            if last_message:
-                chat_data["last_message"] = last_message.text
-                chat_data["last_message_time"] = last_message.created_at.strftime("%H:%M")
-            else:
-                chat_data["last_message"] = "Нет сообщений"
-                chat_data["last_message_time"] = ""
-            
-            unread_count = await Message.filter(
-                chat_id=chat.id, 
-                read=False
-            ).exclude(sender_id=user_id).count()
-            chat_data["unread_count"] = unread_count
-            
-            partner_id = chat_data["partner_id"]
-            partner_status = await UserStatus.filter(user_id=partner_id).first()
-            chat_data["online"] = partner_status.online if partner_status else False
-            
-            serialized_chats.append(chat_data)
-        
-        return JSONResponse({
+        return FastJSONResponse({
             "success": True,
             "chats": serialized_chats
         })
         
     except Exception as e:
-        return JSONResponse({
+        return FastJSONResponse({
             "success": False,
             "error": str(e)
         }, status_code=500)
 
 
 @router.post("/messages/mark-read")
-async def mark_as_read(request: dict) -> JSONResponse:
+async def mark_as_read(request: dict, auth_data: WebAppInitData = Depends(auth)) -> FastJSONResponse:
     try:
         chat_id = request.get("chat_id")
         user_id = request.get("user_id")
         
         if not all([chat_id, user_id]):
-            return JSONResponse({
+            return FastJSONResponse({
                 "success": False,
                 "error": "Необходимы chat_id и user_id"
             }, status_code=400)
         
-        await Message.filter(
-            chat_id=chat_id
-        ).exclude(sender_id=user_id).update(read=True)
+        if not is_caller(auth_data, user_id):
+            return forbidden()
+        
+        chat = await Chat.filter(
+            Q(id=chat_id, user1_id=user_id) | Q(id=chat_id, user2_id=user_id)
+        ).first()
+        
+        if not chat:
+            return FastJSONResponse({
+                "success": False,
+                "error": "Чат не найден"
+            }, status_code=404)
+        
+        async with in_transaction("default"):
+            marked = await Message.filter(
+                chat_id=chat_id,
+                read=False
+            ).exclude(sender_id=user_id).update(read=True)
+            await reset_unread(chat_id, user_id)
+            if marked:
+                await record_read(chat_id, user_id)
+        
+        if marked:
+            await publish_read(chat, user_id)
         
-        return JSONResponse({
+        return FastJSONResponse({
             "success": True,
             "message": "Сообщения помечены как прочитанные"
         })
         
     except Exception as e:
-        return JSONResponse({
+        return FastJSONResponse({
+            "success": False,
+            "error": str(e)
+        }, status_code=500)
+
+
+@router.post("/messages/mark-read/batch")
+async def mark_as_read_batch(request: dict, auth_data: WebAppInitData = Depends(auth)) -> FastJSONResponse:
+    try:
+        user_id = request.get("user_id")
+        items = request.get("chats")
+        
+        if not user_id or not isinstance(items, list) or not items:
+            return FastJSONResponse({
+                "success": False,
+                "error": "Необходимы user_id и chats"
+            }, status_code=400)
+        
+        if not is_caller(auth_data, user_id):
+            return forbidden()
+        
+        if len(items) > MARK_READ_BATCH_MAX:
+            return FastJSONResponse({
+                "success": False,
+                "error": f"Не больше {MARK_READ_BATCH_MAX} чатов за раз"
+            }, status_code=400)
+        
+        up_to: Dict[int, int] = {}
+        for item in items:
+            if not isinstance(item, dict) or not item.get("chat_id") or not item.get("up_to_id"):
+                return FastJSONResponse({
+                    "success": False,
+                    "error": "Необходимы chat_id и up_to_id"
+                }, status_code=400)
+            up_to[item["chat_id"]] = max(up_to.get(item["chat_id"], 0), item["up_to_id"])
+        
+        chats = await Chat.filter(
+            Q(id__in=list(up_to), user1_id=user_id) | Q(id__in=list(up_to), user2_id=user_id)
+        )
+        if not chats:
+            return FastJSONResponse({"success": True, "marked": 0})
+        
+        async with in_transaction("default"):
+            marked = await Message.filter(
+                Q(*(Q(chat_id=chat.id, id__lte=up_to[chat.id]) for chat in chats), join_type=Q.OR),
+                read=False
+            ).exclude(sender_id=user_id).update(read=True)
+            await recount_unread([chat.id for chat in chats], user_id)
+            if marked:
+                for chat in chats:
+                    await record_read(chat.id, user_id, up_to[chat.id])
+        
+        if marked:
+            for chat in chats:
+                await publish_read(chat, user_id)
+        
+        return FastJSONResponse({
+            "success": True,
+            "marked": marked
+        })
+        
+    except Exception as e:
+        return FastJSONResponse({
             "success": False,
             "error": str(e)
         }, status_code=500)
 
 
 @router.post("/user-status/update")
-async def update_user_status(request: dict) -> JSONResponse:
+async def update_user_status(request: dict, auth_data: WebAppInitData = Depends(auth)) -> FastJSONResponse:
     try:
         user_id = request.get("user_id")
         user_name = request.get("user_name")
         online = request.get("online", False)
         
         if not all([user_id, user_name]):
-            return JSONResponse({
+            return FastJSONResponse({
                 "success": False,
                 "error": "Необходимы user_id и user_name"
             }, status_code=400)
         
-        status, created = await UserStatus.update_or_create(
-            user_id=user_id,
-            defaults={
-                'user_name': user_name,
-                'online': online
-            }
-        )
+        if not is_caller(auth_data, user_id):
+            return forbidden()
+        
+        created = presence.get(user_id) is None
+        if presence.heartbeat(user_id, user_name, online):
+            await publish_presence(user_id, online)
+        status = presence.get(user_id)
         
-        return JSONResponse({
+        return FastJSONResponse({
             "success": True,
             "status": serialize_user_status(status),
             "is_new": created
         })
         
     except Exception as e:
-        return JSONResponse({
+        return FastJSONResponse({
             "success": False,
             "error": str(e)
         }, status_code=500)
 
 
 @router.get("/user-status/{user_id}")
-async def get_user_status(user_id: int) -> JSONResponse:
+async def get_user_status(user_id: int) -> FastJSONResponse:
     try:
-        status = await UserStatus.filter(user_id=user_id).first()
+        status = presence.get(user_id)
+        if not status:
+            status = await UserStatus.filter(user_id=user_id).first()
+            if status:
+                status.online = False
         if not status:
-            return JSONResponse({
+            return FastJSONResponse({
                 "success": False,
                 "error": "Пользователь не найден"
             }, status_code=404)
         
-        return JSONResponse({
+        return FastJSONResponse({
             "success": True,
             "status": serialize_user_status(status)
         })
         
     except Exception as e:
-        return JSONResponse({
+        return FastJSONResponse({
             "success": False,
             "error": str(e)
         }, status_code=500)
\ No newline at end of file
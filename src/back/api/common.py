@@ -1,13 +1,39 @@
-from fastapi import APIRouter, Request
+import logging
+
+from fastapi import APIRouter, Request, Response
 from aiogram.types import Update
-from pydantic import BaseModel
 
-from config_reader import config, bot, dp
+from config_reader import bot
+from services.metrics import metrics
+from services.notifications import notifier
+from services.realtime import hub
+from services.serialization import FastJSONResponse
+from services.updates import update_queue
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
 
 @router.post("/webhook")
-async def webhook(request: Request) -> None:
-    update = Update.model_validate(await request.json(), context={"bot": bot})
-    await dp.feed_update(bot, update)
+async def webhook(request: Request) -> Response:
+    try:
+        update = Update.model_validate(await request.json(), context={"bot": bot})
+    except ValueError:
+        return Response(status_code=400)
+
+    if not update_queue.submit(update):
+        logger.warning("Update queue full, rejected update %s", update.update_id)
+        return Response(status_code=503)
+    logger.debug("Queued update %s", update.update_id)
+    return Response(status_code=200)
+
+
+@router.get("/webhook/stats")
+async def webhook_stats() -> FastJSONResponse:
+    return FastJSONResponse({"queue": update_queue.stats(), "notifications": notifier.stats(), "realtime": hub.stats()})
+
+
+@router.get("/metrics")
+async def get_metrics() -> Response:
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,52 @@
+import asyncio
+from typing import Optional
+
+from aiogram.utils.web_app import WebAppInitData
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+
+from services.realtime import hub
+from .utils import is_caller, verify_init_data
+
+router = APIRouter(prefix="/api")
+
+AUTH_FRAME_TIMEOUT = 10.0
+
+
+def authorized(raw: Optional[str], user_id: int) -> bool:
+    try:
+        data: WebAppInitData = verify_init_data(raw)
+    except HTTPException:
+        return False
+    return is_caller(data, user_id)
+
+
+@router.websocket("/ws/{user_id}")
+async def events(websocket: WebSocket, user_id: int) -> None:
+    # Browsers cannot set headers on a WebSocket, so initData comes either
+    # in the query string or as the first frame after the handshake.
+    raw = websocket.query_params.get("initData")
+    if raw is not None:
+        if not authorized(raw, user_id):
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        await websocket.accept()
+    else:
+        await websocket.accept()
+        try:
+            raw = await asyncio.wait_for(websocket.receive_text(), AUTH_FRAME_TIMEOUT)
+        except asyncio.TimeoutError:
+            raw = None
+        except WebSocketDisconnect:
+            return
+        if not authorized(raw, user_id):
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+
+    await hub.connect(user_id, websocket)
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.disconnect(user_id, websocket)
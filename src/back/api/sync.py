@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends
+
+from config_reader import config
+from db import Advert, Chat, Message
+from services.presence import presence
+from services.serialization import FastJSONResponse
+from services.sync import SYNC_PAGE_SIZE, SYNC_PAGE_MAX, collect_changes
+from typing import Optional
+
+from .adverts import advert_plan
+from .chats import serialize_chat, serialize_message
+from .utils import auth, own_user
+
+router = APIRouter(prefix="/api", dependencies=[Depends(auth)])
+
+
+@router.get("/sync/{user_id}", dependencies=[Depends(own_user)])
+async def sync(user_id: int, since: Optional[int] = None, limit: int = SYNC_PAGE_SIZE) -> FastJSONResponse:
+    try:
+        limit = max(1, min(limit, SYNC_PAGE_MAX))
+        changes = await collect_changes(user_id, since, limit, config.SYNC_SETTLE_SECONDS)
+        
+        adverts = await Advert.filter(id__in=changes.adverts).values(*advert_plan.fields) if changes.adverts else []
+        chats = await Chat.filter(id__in=changes.chats) if changes.chats else []
+        messages = await Message.filter(id__in=changes.messages).order_by("id") if changes.messages else []
+        
+        return FastJSONResponse({
+            "success": True,
+            "since": changes.since,
+            "reset": changes.reset,
+            "has_more": changes.has_more,
+            "adverts": adverts,
+            "deleted_adverts": changes.deleted_adverts,
+            "chats": [serialize_chat(chat, user_id) for chat in chats],
+            "messages": [serialize_message(message, user_id) for message in messages],
+            "deleted_messages": changes.deleted_messages,
+            "reads": [
+                {"chat_id": chat_id, "reader_id": reader_id, "up_to_id": up_to_id}
+                for chat_id, reader_id, up_to_id in changes.reads
+            ],
+            "statuses": presence.lookup(changes.partner_ids)
+        })
+        
+    except Exception as e:
+        return FastJSONResponse({
+            "success": False,
+            "error": str(e)
+        }, status_code=500)
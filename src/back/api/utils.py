@@ -1,26 +1,55 @@
-from fastapi import Request, HTTPException
+import logging
+from typing import Any, Optional
+
+from fastapi import Depends, Request, HTTPException
 
 from aiogram.utils.web_app import WebAppInitData, safe_parse_webapp_init_data
 
 from db import User
 from config_reader import config
+from services.auth import verified_init_data, user_cache, known_users
 
-def auth(request: Request) -> WebAppInitData:
-    try:
-        auth_string = request.headers.get("initData", None)
-        if auth_string:
-            data = safe_parse_webapp_init_data(config.BOT_TOKEN.get_secret_value(), auth_string)
-            return data
+logger = logging.getLogger(__name__)
+
+async def auth(request: Request) -> WebAppInitData:
+    return verify_init_data(request.headers.get("initData", None))
+
+def verify_init_data(auth_string: Optional[str]) -> WebAppInitData:
+    if not auth_string:
         raise HTTPException(401, {"error": "Unauthorized"})
+
+    data = verified_init_data.get(auth_string)
+    if data is not None:
+        return data
+
+    try:
+        data = safe_parse_webapp_init_data(config.BOT_TOKEN.get_secret_value(), auth_string)
     except Exception as e:
-        print(e)
+        logger.info("Rejected init data: %s", e)
         raise HTTPException(401, {"error": "Unauthorized"})
 
+    if verified_init_data.is_expired(data):
+        raise HTTPException(401, {"error": "Unauthorized"})
+    verified_init_data.remember(auth_string, data)
+    return data
+
+def is_caller(data: WebAppInitData, user_id: Any) -> bool:
+    # Ids in paths and bodies come from the client; only initData is signed.
+    return data.user is not None and user_id is not None and str(data.user.id) == str(user_id)
+
+async def own_user(user_id: int, data: WebAppInitData = Depends(auth)) -> None:
+    if not is_caller(data, user_id):
+        raise HTTPException(403, {"error": "Forbidden"})
+
 async def check_user(user_id: int) -> User:
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
     user = await User.filter(id=user_id).first()
     if not user:
-        print(user)
+        logger.info("Unknown user %s", user_id)
         raise HTTPException(401, {"error": "Unauthorized"})
+    user_cache.put(user_id, user)
+    known_users.put(user_id, (user.name, user.username))
     return user
-
-
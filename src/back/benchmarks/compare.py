@@ -0,0 +1,44 @@
+import argparse
+import json
+from typing import Any, Dict
+
+
+METRICS = ("throughput", "p50_ms", "p95_ms", "p99_ms", "queries_per_request", "errors")
+HIGHER_IS_BETTER = {"throughput"}
+
+
+def delta(metric: str, base: float, new: float) -> str:
+    if base == new:
+        return "="
+    if not base:
+        return "new"
+    change = (new - base) / base * 100
+    better = (change > 0) == (metric in HIGHER_IS_BETTER)
+    return f"{change:+.1f}% {'better' if better else 'worse'}"
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any]) -> None:
+    for name, new_summary in new["scenarios"].items():
+        base_summary = base["scenarios"].get(name)
+        if base_summary is None:
+            print(f"{name}: not present in the base run")
+            continue
+        print(name)
+        for metric in METRICS:
+            before, after = base_summary[metric], new_summary[metric]
+            print(f"  {metric:<20}{before:>10}  ->{after:>10}  {delta(metric, before, after)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmarks.load reports")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    if base["meta"] != new["meta"]:
+        print(f"warning: runs used different settings\n  base: {base['meta']}\n  new:  {new['meta']}")
+    compare(base, new)
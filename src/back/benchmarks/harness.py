@@ -0,0 +1,74 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import List, Optional
+from urllib.parse import urlencode
+
+
+BENCH_DB_URL = "sqlite://:memory:"
+BENCH_BOT_TOKEN = "123456:benchmark"
+
+_query_counter: ContextVar[Optional[List[int]]] = ContextVar("query_counter", default=None)
+
+
+def bootstrap(db_url: str) -> None:
+    # config_reader reads the environment on import, so this has to run first.
+    os.environ["DB_URL"] = db_url
+    os.environ.setdefault("BOT_TOKEN", BENCH_BOT_TOKEN)
+
+
+async def init_db(generate: bool = True) -> None:
+    from tortoise import Tortoise
+    from config_reader import TORTOISE_ORM
+
+    config = dict(TORTOISE_ORM)
+    config["apps"] = {
+        name: {
+            **app,
+            "models": [module for module in app["models"] if not module.startswith("aerich")]
+        }
+        for name, app in TORTOISE_ORM["apps"].items()
+    }
+    await Tortoise.init(config)
+    if generate:
+        await Tortoise.generate_schemas(safe=True)
+
+
+def sign_init_data(bot_token: str, user_id: int) -> str:
+    fields = {
+        "auth_date": str(int(time.time())),
+        "query_id": f"bench{user_id}",
+        "user": json.dumps({"id": user_id, "first_name": f"user {user_id}"}, separators=(",", ":")),
+    }
+    check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+class QueryCounter(logging.Handler):
+    # Every tortoise client logs each statement it runs on this logger at
+    # DEBUG level; connection setup messages carry other format strings.
+    def emit(self, record: logging.LogRecord) -> None:
+        counter = _query_counter.get()
+        if counter is not None and (record.msg == "%s: %s" or not record.args):
+            counter[0] += 1
+
+    @classmethod
+    def install(cls) -> "QueryCounter":
+        handler = cls(logging.DEBUG)
+        logger = logging.getLogger("tortoise.db_client")
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(handler)
+        logger.propagate = False
+        return handler
+
+
+def start_counting() -> List[int]:
+    counter = [0]
+    _query_counter.set(counter)
+    return counter
@@ -0,0 +1,236 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from tortoise import Tortoise, run_async
+
+from benchmarks.harness import BENCH_DB_URL, QueryCounter, bootstrap, init_db, sign_init_data, start_counting
+from benchmarks.seed import CITY_CENTER, CITY_SPAN, add_volume_arguments, seed, volumes_from
+
+
+# (method, url, json body) for one request of a scenario.
+RequestSpec = Tuple[str, str, Optional[Dict[str, Any]]]
+
+
+@dataclass
+class Dataset:
+    user_ids: List[int]
+    chats: List[Tuple[int, int, int]]
+    categories: List[str]
+    update_id: int = 0
+
+
+@dataclass
+class ScenarioResult:
+    latencies: List[float] = field(default_factory=list)
+    queries: List[int] = field(default_factory=list)
+    errors: int = 0
+    elapsed: float = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "requests": len(latencies),
+            "errors": self.errors,
+            "throughput": round(len(latencies) / self.elapsed, 1) if self.elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "queries_per_request": round(statistics.fmean(self.queries), 2) if self.queries else 0.0,
+        }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values) + 0.5) - 1))
+    return values[index] * 1000
+
+
+def inbox(data: Dataset, rng: random.Random) -> RequestSpec:
+    return "GET", f"/api/chats/{rng.choice(data.user_ids)}", None
+
+
+def history(data: Dataset, rng: random.Random) -> RequestSpec:
+    chat_id, user1_id, user2_id = rng.choice(data.chats)
+    return "GET", f"/api/chats/{chat_id}/messages/{rng.choice((user1_id, user2_id))}", None
+
+
+def catalog(data: Dataset, rng: random.Random) -> RequestSpec:
+    params = rng.choice((
+        {},
+        {"category": rng.choice(data.categories)},
+        {"category": rng.choice(data.categories), "sort": "cheapest"},
+        {"available": "true", "max_price": str(rng.randrange(500, 5000, 500))},
+    ))
+    return "GET", "/api/advert/get/all?" + "&".join(f"{key}={value}" for key, value in params.items()), None
+
+
+def nearby(data: Dataset, rng: random.Random) -> RequestSpec:
+    lat = CITY_CENTER[0] + rng.uniform(-CITY_SPAN, CITY_SPAN)
+    lon = CITY_CENTER[1] + rng.uniform(-CITY_SPAN, CITY_SPAN) * 1.8
+    return "GET", f"/api/advert/nearby?lat={lat:.5f}&lon={lon:.5f}&radius_km={rng.choice((2, 5, 10))}", None
+
+
+def send(data: Dataset, rng: random.Random) -> RequestSpec:
+    chat_id, user1_id, user2_id = rng.choice(data.chats)
+    return "POST", "/api/messages/send", {
+        "chat_id": chat_id,
+        "sender_id": rng.choice((user1_id, user2_id)),
+        "text": "Нагрузочное сообщение",
+    }
+
+
+def webhook(data: Dataset, rng: random.Random) -> RequestSpec:
+    data.update_id += 1
+    user_id = rng.choice(data.user_ids)
+    return "POST", "/webhook", {
+        "update_id": data.update_id,
+        "message": {
+            "message_id": data.update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user {user_id}"},
+            "text": "/start",
+        },
+    }
+
+
+SCENARIOS: Dict[str, Callable[[Dataset, random.Random], RequestSpec]] = {
+    "inbox": inbox,
+    "history": history,
+    "catalog": catalog,
+    "nearby": nearby,
+    "send": send,
+    "webhook": webhook,
+}
+
+
+async def load_dataset() -> Dataset:
+    from db import Advert, Chat, User
+
+    user_ids = await User.all().order_by("id").values_list("id", flat=True)
+    chats = await Chat.all().order_by("id").values_list("id", "user1_id", "user2_id")
+    categories = await Advert.all().distinct().values_list("category", flat=True)
+    if not user_ids or not chats:
+        raise SystemExit("The database is empty; run benchmarks.seed first or pass --seed")
+    return Dataset(list(user_ids), list(chats), sorted(categories))
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    make_request: Callable[[Dataset, random.Random], RequestSpec],
+    data: Dataset,
+    rng: random.Random,
+    total: int,
+    concurrency: int
+) -> ScenarioResult:
+    result = ScenarioResult()
+    remaining = total
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            method, url, body = make_request(data, rng)
+            # httpx runs the app in this task, so queries are attributed here.
+            counter = start_counting()
+            started = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            result.latencies.append(time.perf_counter() - started)
+            result.queries.append(counter[0])
+            if response.status_code >= 400:
+                result.errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def main(args: argparse.Namespace) -> None:
+    from config_reader import config
+    from server import create_app
+    from services.cache import advert_cache
+    from services.realtime import hub
+    from services.search import advert_search
+    from services.updates import update_queue
+
+    await init_db()
+    if args.seed:
+        await seed(volumes_from(args), random.Random(args.seed_value))
+
+    data = await load_dataset()
+    rng = random.Random(args.seed_value)
+    if args.no_cache:
+        advert_cache.configure(0, 0)
+
+    await advert_search.prepare()
+    await hub.start()
+    # The webhook burst measures ingestion only: feeding the dispatcher would
+    # make handlers call the Telegram API.
+    await update_queue.start(lambda update: asyncio.sleep(0), config.WEBHOOK_WORKERS, config.WEBHOOK_QUEUE_SIZE)
+    QueryCounter.install()
+
+    init_data = sign_init_data(config.BOT_TOKEN.get_secret_value(), data.user_ids[0])
+    transport = httpx.ASGITransport(app=create_app())
+    report: Dict[str, Any] = {
+        "meta": {
+            "db": Tortoise.get_connection("default").capabilities.dialect,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "users": len(data.user_ids),
+            "chats": len(data.chats),
+            "advert_cache": not args.no_cache,
+        },
+        "scenarios": {},
+    }
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers={"initData": init_data}) as client:
+        for name in args.scenario or list(SCENARIOS):
+            if args.warmup:
+                await run_scenario(client, SCENARIOS[name], data, rng, args.warmup, args.concurrency)
+            result = await run_scenario(client, SCENARIOS[name], data, rng, args.requests, args.concurrency)
+            report["scenarios"][name] = result.summary()
+            print_row(name, report["scenarios"][name])
+
+    await update_queue.stop()
+    await hub.stop()
+    await Tortoise.close_connections()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def print_row(name: str, summary: Dict[str, Any]) -> None:
+    print(
+        f"{name:<10}{summary['requests']:>7} req {summary['throughput']:>9.1f} req/s  "
+        f"p50 {summary['p50_ms']:>8.2f}ms  p95 {summary['p95_ms']:>8.2f}ms  p99 {summary['p99_ms']:>8.2f}ms  "
+        f"{summary['queries_per_request']:>5.1f} q/req  {summary['errors']} errors"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run load scenarios against the API in-process")
+    parser.add_argument("--db-url", default=BENCH_DB_URL)
+    parser.add_argument("--seed", action="store_true", help="seed the database before running")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="repeatable; defaults to all")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--no-cache", action="store_true", help="disable the advert response cache")
+    parser.add_argument("--output", help="write the report as JSON for benchmarks.compare")
+    add_volume_arguments(parser)
+    args = parser.parse_args()
+    if args.db_url == BENCH_DB_URL:
+        args.seed = True
+
+    bootstrap(args.db_url)
+    run_async(main(args))
@@ -0,0 +1,166 @@
+import argparse
+import asyncio
+import json
+import sys
+from datetime import date
+from typing import Any, Dict, Iterable, List, Tuple
+
+from tortoise import BaseDBAsyncClient, Tortoise
+from tortoise.expressions import Q
+from tortoise.functions import Count, Max, Min
+from tortoise.transactions import in_transaction
+
+from db import Advert, Booking, CategoryFacet, Chat, ChatSummary, Message, MessageArchive
+from services.catalog import ListingQuery
+from services.geo import cells_within, geo_cell, overlapping
+
+
+BENCH_DB_URL = "sqlite://:memory:"
+
+USERS = 200
+CHATS = 2000
+MESSAGES_PER_CHAT = 10
+
+
+def hot_path_queries() -> List[Tuple[str, str]]:
+    user_id, partner_id, chat_id = 7, 8, 42
+    return [
+        ("inbox chats", Chat.filter(Q(user1_id=user_id) | Q(user2_id=user_id)).sql(params_inline=True)),
+        ("chat search", Chat.filter(
+            Q(user1_id=user_id, user2_name__icontains="user") |
+            Q(user2_id=user_id, user1_name__icontains="user")
+        ).sql(params_inline=True)),
+        ("create_chat dedup", Chat.filter(
+            advert_id=1, user1_id=user_id, user2_id=partner_id
+        ).limit(1).sql(params_inline=True)),
+        ("inbox summaries", ChatSummary.filter(
+            user_id=user_id, chat_id__in=[chat_id, chat_id + 1]
+        ).sql(params_inline=True)),
+        ("message history", Message.filter(
+            chat_id=chat_id, id__lt=1000
+        ).order_by("-id").limit(51).sql(params_inline=True)),
+        ("mark read", Message.filter(
+            chat_id=chat_id, read=False
+        ).exclude(sender_id=user_id).update(read=True).sql(params_inline=True)),
+        ("unread counts", Message.filter(chat_id__in=[chat_id, chat_id + 1], read=False)
+            .annotate(unread=Count("id"))
+            .group_by("chat_id", "sender_id")
+            .values("chat_id", "sender_id", "unread")
+            .sql(params_inline=True)),
+        ("owner adverts", Advert.filter(owner_id=user_id).order_by("-created_at").sql(params_inline=True)),
+        ("listing by category", ListingQuery(category="tools").queryset().sql(params_inline=True)),
+        ("listing by price", ListingQuery(category="tools", sort="cheapest").queryset().sql(params_inline=True)),
+        ("listing available", ListingQuery(available=True).queryset().sql(params_inline=True)),
+        ("nearby cells", Advert.filter(
+            geo_cell__in=cells_within(55.75, 37.62, 5), available=True
+        ).sql(params_inline=True)),
+        ("booking overlap", Booking.filter(
+            overlapping(date(2025, 6, 1), date(2025, 6, 7)), advert_id__in=[1, 2, 3]
+        ).sql(params_inline=True)),
+        ("facet update", CategoryFacet.filter(category="tools").update(total=1).sql(params_inline=True)),
+        ("archivable chats", Message.filter(chat_id__in=[chat_id, chat_id + 1]).annotate(
+            first_id=Min("id"), last_id=Max("id")
+        ).group_by("chat_id").values_list("first_id", "last_id").sql(params_inline=True)),
+        ("archive segments", MessageArchive.filter(
+            chat_id=chat_id, first_id__lt=1000
+        ).order_by("-last_id").values_list("id", "count").sql(params_inline=True)),
+    ]
+
+
+async def seed() -> None:
+    await Advert.bulk_create([
+        Advert(
+            owner_id=i % USERS,
+            owner_name=f"user {i % USERS}",
+            title=f"Advert {i}",
+            description="description",
+            period="день",
+            price=100 + i % 500,
+            deposit=0,
+            category=("tools", "bikes", "camping")[i % 3],
+            available=i % 4 != 0,
+            latitude=55.5 + i % 100 / 200,
+            longitude=37.3 + i % 97 / 150,
+            geo_cell=geo_cell(55.5 + i % 100 / 200, 37.3 + i % 97 / 150),
+        )
+        for i in range(CHATS)
+    ], batch_size=1000)
+    await Booking.bulk_create([
+        Booking(advert_id=i, starts_on=date(2025, 1 + i % 12, 1), ends_on=date(2025, 1 + i % 12, 10))
+        for i in range(1, CHATS + 1)
+    ], batch_size=1000)
+    await Chat.bulk_create([
+        Chat(
+            advert_id=i,
+            user1_id=i % USERS,
+            user2_id=(i * 7 + 1) % USERS,
+            user1_name=f"user {i % USERS}",
+            user2_name=f"user {(i * 7 + 1) % USERS}",
+        )
+        for i in range(CHATS)
+    ], batch_size=1000)
+    await ChatSummary.bulk_create([
+        ChatSummary(chat_id=chat_id, user_id=user_id)
+        for chat_id in range(1, CHATS + 1)
+        for user_id in (chat_id % USERS, (chat_id * 7 + 1) % USERS)
+    ], batch_size=1000)
+    await Message.bulk_create([
+        Message(chat_id=chat_id, sender_id=chat_id % USERS, text="hello", read=n % 3 == 0)
+        for chat_id in range(1, CHATS + 1)
+        for n in range(MESSAGES_PER_CHAT)
+    ], batch_size=1000)
+
+
+def postgres_seq_scans(plan: Dict[str, Any]) -> Iterable[str]:
+    if plan.get("Node Type") == "Seq Scan":
+        yield f"Seq Scan on {plan.get('Relation Name')}"
+    for child in plan.get("Plans", ()):
+        yield from postgres_seq_scans(child)
+
+
+async def explain(connection: BaseDBAsyncClient, sql: str) -> List[str]:
+    if connection.capabilities.dialect == "postgres":
+        async with in_transaction() as transaction:
+            # Seeded tables are small, so let the planner fall back to a seq
+            # scan only when no index can serve the query at all.
+            await transaction.execute_script("SET LOCAL enable_seqscan = off")
+            rows = await transaction.execute_query_dict(f"EXPLAIN (FORMAT JSON) {sql}")
+        plan = rows[0]["QUERY PLAN"]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return list(postgres_seq_scans(plan[0]["Plan"]))
+
+    rows = await connection.execute_query_dict(f"EXPLAIN QUERY PLAN {sql}")
+    return [
+        row["detail"] for row in rows
+        if row["detail"].startswith("SCAN ") and " USING " not in row["detail"]
+    ]
+
+
+async def main(db_url: str, skip_seed: bool) -> int:
+    await Tortoise.init(db_url=db_url, modules={"models": ["db.models.adverts", "db.models.chat"]})
+    if not skip_seed:
+        await Tortoise.generate_schemas(safe=True)
+        await seed()
+
+    connection = Tortoise.get_connection("default")
+    queries = hot_path_queries()
+    failures = 0
+    for name, sql in queries:
+        scans = await explain(connection, sql)
+        status = "FAIL" if scans else "ok"
+        print(f"{status:<5}{name}" + (f": {', '.join(scans)}" if scans else ""))
+        failures += bool(scans)
+    print(f"{failures} of {len(queries)} hot-path queries fall back to a sequential scan")
+
+    await Tortoise.close_connections()
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if a hot-path query plan falls back to a sequential scan")
+    parser.add_argument("--db-url", default=BENCH_DB_URL)
+    parser.add_argument("--skip-seed", action="store_true", help="explain against an existing, already populated database")
+    args = parser.parse_args()
+    # run_async discards the result, and main closes its connections itself.
+    sys.exit(1 if asyncio.run(main(args.db_url, args.skip_seed)) else 0)
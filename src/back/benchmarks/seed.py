@@ -0,0 +1,138 @@
+import argparse
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Set, Tuple
+
+from tortoise import Tortoise, run_async
+
+from benchmarks.harness import bootstrap, init_db
+
+
+FIRST_USER_ID = 100_000_000
+BATCH_SIZE = 1000
+
+CATEGORIES = ("Инструменты", "Спорт", "Туризм", "Электроника", "Транспорт", "Детское", "Для дома", "Фото и видео")
+ITEMS = ("дрель", "перфоратор", "велосипед", "палатка", "самокат", "проектор", "камера", "лыжи", "сноуборд", "коляска", "шуруповёрт", "лестница")
+ADJECTIVES = ("новый", "мощный", "лёгкий", "складной", "профессиональный", "компактный", "детский", "электрический")
+PHRASES = (
+    "Здравствуйте, ещё актуально?", "Да, свободно", "Можно забрать завтра утром?", "Какой залог?",
+    "Договорились", "Спасибо!", "А на выходные можно?", "Отправил геолокацию", "Во сколько удобно?",
+)
+PERIODS = ("час", "день", "неделя", "месяц")
+CITY_CENTER = (55.75, 37.62)
+CITY_SPAN = 0.3
+
+
+@dataclass(frozen=True)
+class Volumes:
+    users: int = 1000
+    adverts: int = 20000
+    chats: int = 5000
+    messages_per_chat: int = 40
+
+
+async def seed(volumes: Volumes, rng: random.Random) -> None:
+    from db import Advert, Chat, Message, User
+    from db.summaries import rebuild_all_summaries
+    from services.counters import reconcile_counters
+    from services.geo import geo_cell
+
+    user_ids = [FIRST_USER_ID + i for i in range(volumes.users)]
+    await User.bulk_create([
+        User(id=user_id, name=f"Пользователь {user_id}", username=f"user{user_id}")
+        for user_id in user_ids
+    ], batch_size=BATCH_SIZE)
+
+    now = datetime.now(timezone.utc)
+    await Advert.bulk_create([
+        Advert(
+            owner_id=(owner_id := rng.choice(user_ids)),
+            owner_name=f"Пользователь {owner_id}",
+            created_at=now - timedelta(minutes=rng.randrange(60 * 24 * 90)),
+            title=f"{rng.choice(ADJECTIVES).capitalize()} {rng.choice(ITEMS)}",
+            description=" ".join(rng.choice(ADJECTIVES) + " " + rng.choice(ITEMS) for _ in range(12)),
+            period=rng.choice(PERIODS),
+            price=rng.randrange(100, 5000, 50),
+            deposit=rng.randrange(0, 20000, 500),
+            category=rng.choice(CATEGORIES),
+            available=rng.random() < 0.8,
+            latitude=(latitude := CITY_CENTER[0] + rng.uniform(-CITY_SPAN, CITY_SPAN)),
+            longitude=(longitude := CITY_CENTER[1] + rng.uniform(-CITY_SPAN, CITY_SPAN) * 1.8),
+            geo_cell=geo_cell(latitude, longitude),
+        )
+        for _ in range(volumes.adverts)
+    ], batch_size=BATCH_SIZE)
+
+    seen: Set[Tuple[int, int, int]] = set()
+    chats: List[Chat] = []
+    while len(chats) < volumes.chats:
+        user1_id, user2_id = rng.sample(user_ids, 2)
+        key = (rng.randrange(1, volumes.adverts + 1), user1_id, user2_id)
+        if key in seen:
+            continue
+        seen.add(key)
+        chats.append(Chat(
+            advert_id=key[0],
+            user1_id=user1_id,
+            user2_id=user2_id,
+            user1_name=f"Пользователь {user1_id}",
+            user2_name=f"Пользователь {user2_id}",
+        ))
+    await Chat.bulk_create(chats, batch_size=BATCH_SIZE)
+
+    chat_rows = await Chat.all().order_by("id").values_list("id", "user1_id", "user2_id")
+    batch: List[Message] = []
+    for chat_id, user1_id, user2_id in chat_rows:
+        started = now - timedelta(minutes=rng.randrange(60 * 24 * 30))
+        unread_from = volumes.messages_per_chat - rng.randrange(0, 4)
+        for n in range(volumes.messages_per_chat):
+            batch.append(Message(
+                chat_id=chat_id,
+                sender_id=user1_id if rng.random() < 0.5 else user2_id,
+                text=rng.choice(PHRASES),
+                created_at=started + timedelta(minutes=n * 7),
+                read=n < unread_from,
+            ))
+        if len(batch) >= BATCH_SIZE * 10:
+            await Message.bulk_create(batch, batch_size=BATCH_SIZE)
+            batch = []
+    if batch:
+        await Message.bulk_create(batch, batch_size=BATCH_SIZE)
+
+    await rebuild_all_summaries()
+    await reconcile_counters()
+
+
+async def main(db_url: str, volumes: Volumes, seed_value: int) -> None:
+    await init_db()
+    started = time.perf_counter()
+    await seed(volumes, random.Random(seed_value))
+    print(
+        f"Seeded {volumes.users} users, {volumes.adverts} adverts, {volumes.chats} chats, "
+        f"{volumes.chats * volumes.messages_per_chat} messages in {time.perf_counter() - started:.1f}s"
+    )
+    await Tortoise.close_connections()
+
+
+def add_volume_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = Volumes()
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--adverts", type=int, default=defaults.adverts)
+    parser.add_argument("--chats", type=int, default=defaults.chats)
+    parser.add_argument("--messages-per-chat", type=int, default=defaults.messages_per_chat)
+    parser.add_argument("--random-seed", type=int, default=42, dest="seed_value", help="random seed for reproducible data")
+
+
+def volumes_from(args: argparse.Namespace) -> Volumes:
+    return Volumes(args.users, args.adverts, args.chats, args.messages_per_chat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed a database with realistic benchmark data")
+    parser.add_argument("--db-url", default="sqlite://bench.sqlite3")
+    add_volume_arguments(parser)
+    args = parser.parse_args()
+    bootstrap(args.db_url)
+    run_async(main(args.db_url, volumes_from(args), args.seed_value))
@@ -0,0 +1,129 @@
+import argparse
+import json
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from tortoise import Tortoise, run_async
+
+from db import Advert, AdvertSchema, Message, MessageSchema
+from services.serialization import FieldPlan, dumps, hhmm, orjson
+
+
+BENCH_DB_URL = "sqlite://:memory:"
+
+
+def legacy_advert(advert) -> Dict[str, Any]:
+    data = advert.model_dump()
+    for key, value in data.items():
+        if isinstance(value, datetime):
+            data[key] = value.isoformat()
+    return data
+
+
+def legacy_message(message, current_user_id: int) -> Dict[str, Any]:
+    return {
+        "id": message.id,
+        "chat_id": message.chat_id,
+        "text": message.text,
+        "timestamp": message.created_at.strftime("%H:%M") if hasattr(message.created_at, 'strftime') else "00:00",
+        "is_own": message.sender_id == current_user_id,
+        "read": message.read,
+        "sender_id": message.sender_id,
+        "created_at": message.created_at.isoformat() if hasattr(message.created_at, 'isoformat') else str(message.created_at)
+    }
+
+
+# Mirrors api.chats.serialize_message, which can't be imported without a
+# configured bot token.
+def fast_message(message: Message, current_user_id: int) -> Dict[str, Any]:
+    created_at = message.created_at
+    return {
+        "id": message.id,
+        "chat_id": message.chat_id,
+        "text": message.text,
+        "timestamp": hhmm(created_at) if created_at is not None else "00:00",
+        "is_own": message.sender_id == current_user_id,
+        "read": message.read,
+        "sender_id": message.sender_id,
+        "created_at": created_at
+    }
+
+
+async def seed(count: int) -> None:
+    await Advert.bulk_create([
+        Advert(
+            owner_id=1000 + i % 50,
+            owner_name=f"owner {i % 50}",
+            title=f"Дрель ударная {i}",
+            description="Мощная дрель для бетона и кирпича, в комплекте набор свёрл. " * 3,
+            period="день",
+            price=100 + i % 900,
+            deposit=1000,
+            category="Инструменты",
+        )
+        for i in range(count)
+    ], batch_size=1000)
+    await Message.bulk_create([
+        Message(chat_id=1, sender_id=1000 + i % 2, text=f"Сообщение номер {i}, ещё актуально?")
+        for i in range(count)
+    ], batch_size=1000)
+
+
+async def measure(label: str, rounds: int, run: Callable[[], Any]) -> float:
+    best = float("inf")
+    size = 0
+    for _ in range(rounds):
+        started = time.perf_counter()
+        body = await run()
+        best = min(best, time.perf_counter() - started)
+        size = len(body)
+    print(f"  {label:<10} {best * 1000:9.2f} ms  ({size} bytes)")
+    return best
+
+
+async def main(count: int, rounds: int) -> None:
+    await Tortoise.init(db_url=BENCH_DB_URL, modules={"models": ["db.models.adverts", "db.models.chat"]})
+    await Tortoise.generate_schemas()
+    await seed(count)
+
+    advert_plan = FieldPlan(Advert)
+    # Without orjson the fast path falls back to stdlib json.
+    print(f"encoder: {'orjson' if orjson is not None else 'json (orjson not installed)'}")
+
+    async def adverts_legacy() -> bytes:
+        objs = await AdvertSchema.from_queryset(Advert.all())
+        return json.dumps({"adverts": [legacy_advert(obj) for obj in objs]}, ensure_ascii=False).encode("utf-8")
+
+    async def adverts_fast() -> bytes:
+        rows = await Advert.all().values(*advert_plan.fields)
+        return dumps({"adverts": rows})
+
+    async def messages_legacy() -> bytes:
+        objs = await MessageSchema.from_queryset(Message.filter(chat_id=1))
+        return json.dumps({"messages": [legacy_message(obj, 1000) for obj in objs]}, ensure_ascii=False).encode("utf-8")
+
+    async def messages_fast() -> bytes:
+        objs = await Message.filter(chat_id=1)
+        return dumps({"messages": [fast_message(obj, 1000) for obj in objs]})
+
+    results: List[str] = []
+    for name, legacy, fast in (
+        ("adverts", adverts_legacy, adverts_fast),
+        ("messages", messages_legacy, messages_fast),
+    ):
+        print(f"{name} x {count}")
+        legacy_time = await measure("legacy", rounds, legacy)
+        fast_time = await measure("fast", rounds, fast)
+        results.append(f"{name}: {legacy_time / fast_time:.1f}x faster")
+
+    print("\n".join(results))
+    await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare legacy and fast response serialization")
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    run_async(main(args.count, args.rounds))
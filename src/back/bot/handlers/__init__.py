@@ -5,5 +5,5 @@ from . import common
 def setup_routers() -> Router:
     router = Router()
 
-    router.include_router(common.router)
+    router.include_router(common.setup_router())
     return router
\ No newline at end of file
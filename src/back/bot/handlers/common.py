@@ -4,18 +4,19 @@ from aiogram.filters import CommandStart, Command
 
 from bot.keyboards import main_markup
 from config_reader import bot
-from db import User
+from services.auth import upsert_user
 
-router = Router(name="common")
 
-
-@router.message(CommandStart())
 async def start(message: Message) -> None:
-    user = await User.filter(id=message.from_user.id).exists()
-    if not user:
-        await User.create(
-            id=message.from_user.id,
-            name=message.from_user.first_name,
-            username=message.from_user.username
-        )
-    await message.answer("kitwiz", reply_markup=main_markup)
\ No newline at end of file
+    await upsert_user(
+        message.from_user.id,
+        message.from_user.first_name,
+        message.from_user.username or ""
+    )
+    await message.answer("kitwiz", reply_markup=main_markup)
+
+
+def setup_router() -> Router:
+    router = Router(name="common")
+    router.message.register(start, CommandStart())
+    return router
@@ -1,16 +1,37 @@
 from pathlib import Path
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 from pydantic import SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from fastapi import FastAPI
 from tortoise import Tortoise
 
+from services.realtime import hub
+from services.presence import presence
+from services.search import advert_search
+from services.cache import advert_cache
+from services.auth import verified_init_data, user_cache, known_users
+from services.updates import update_queue
+from services.counters import counter_reconciler
+from services.facets import facet_rebuilder
+from services.sync import change_pruner
+from services.archive import message_archiver
+from services.metrics import instrument_queries
+from services.log import setup_logging
+from services.notifications import notifier
+from services.instance import instance_lock
+from db.routing import REPLICA_CONNECTION
+
 
 ROOT_DIR = Path(__file__).parent.parent
 
+POOLED_DB_SCHEMES = ("asyncpg", "postgres", "psql", "psycopg")
+
 
 class Config(BaseSettings):
     BOT_TOKEN: SecretStr
@@ -18,9 +39,67 @@ class Config(BaseSettings):
 
     WEBHOOK_URL: str = "https://qt8ea3f328257673f6594e376295.free.beeceptor.com"
     WEBAPP_URL: str = "https://61cb95e6f54e.ngrok-free.app"
+    BOT_API_URL: Optional[str] = None
 
     APP_HOST: str = 'localhost'
     APP_PORT: int = 8080
+    APP_WORKERS: int = 1
+    APP_LOOP: str = "auto"
+    APP_HTTP: str = "auto"
+
+    DB_POOL_SIZE: int = 20
+    DB_POOL_MIN: int = 1
+    DB_POOL_TIMEOUT: int = 30
+    DB_REPLICA_URL: Optional[SecretStr] = None
+    DB_REPLICA_LAG: float = 2.0
+
+    WS_MAX_PENDING: int = 100
+    WS_SEND_TIMEOUT: float = 5.0
+
+    PRESENCE_TTL: int = 60
+    PRESENCE_FLUSH_INTERVAL: int = 30
+
+    ADVERT_CACHE_SIZE: int = 1024
+    ADVERT_CACHE_TTL: int = 30
+
+    INIT_DATA_MAX_AGE: int = 86400
+    AUTH_CACHE_SIZE: int = 4096
+    USER_CACHE_TTL: int = 30
+    KNOWN_USER_TTL: int = 3600
+
+    WEBHOOK_WORKERS: int = 4
+    WEBHOOK_QUEUE_SIZE: int = 1000
+    WEBHOOK_DRAIN_TIMEOUT: int = 10
+
+    COUNTER_RECONCILE_INTERVAL: int = 3600
+    FACETS_REBUILD_INTERVAL: int = 3600
+
+    SYNC_SETTLE_SECONDS: float = 2.0
+    SYNC_RETENTION_DAYS: float = 7.0
+    SYNC_PRUNE_INTERVAL: int = 3600
+
+    ARCHIVE_AFTER_DAYS: float = 90.0
+    ARCHIVE_INACTIVE_DAYS: float = 30.0
+    ARCHIVE_INTERVAL: int = 3600
+
+    METRICS_ENABLED: bool = True
+    METRICS_SERVER_TIMING: bool = False
+    METRICS_QUERY_THRESHOLD: int = 20
+
+    NOTIFY_GLOBAL_RATE: float = 25.0
+    NOTIFY_CHAT_INTERVAL: float = 1.0
+    NOTIFY_CONCURRENCY: int = 4
+    NOTIFY_MAX_PENDING: int = 10000
+    NOTIFY_DRAIN_TIMEOUT: int = 5
+
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True
+    LOG_SAMPLE_DEFAULT: float = 1.0
+    LOG_SAMPLE_RATES: Dict[str, float] = {
+        "/webhook": 0.1,
+        "/api/user-status/update": 0.05,
+        "/metrics": 0.0,
+    }
 
     model_config = SettingsConfigDict(
         env_file=ROOT_DIR / "back" / ".env",
@@ -28,32 +107,99 @@ class Config(BaseSettings):
     )
 
 
-async def lifespan(app: FastAPI) -> AsyncGenerator:
+def pooled_db_url(url: str, minsize: int, maxsize: int, timeout: int) -> str:
+    parts = urlsplit(url)
+    if parts.scheme not in POOLED_DB_SCHEMES:
+        return url
+    query = dict(parse_qsl(parts.query))
+    query.setdefault("minsize", str(min(minsize, maxsize)))
+    query.setdefault("maxsize", str(maxsize))
+    query.setdefault("timeout", str(timeout))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+async def register_webhook(dispatcher: Dispatcher) -> None:
     await bot.set_webhook(
-        url=f"{config.WEBHOOK_URL}/webhook",\
-        allowed_updates=dp.resolve_used_update_types(),
+        url=f"{config.WEBHOOK_URL}/webhook",
+        allowed_updates=dispatcher.resolve_used_update_types(),
         drop_pending_updates=True
     )
 
+
+async def lifespan(app: FastAPI) -> AsyncGenerator:
+    # Each app gets its own dispatcher from server.create_app.
+    dispatcher: Dispatcher = app.state.dispatcher
+    # The services below keep their state in process memory, and every
+    # worker would re-register the webhook with drop_pending_updates, so
+    # a second worker started by `uvicorn --workers N` refuses to start.
+    if not instance_lock.acquire(f"back-{config.APP_PORT}"):
+        raise RuntimeError("Another worker of this app is already running; run one worker per instance")
+    log_listener = setup_logging(config.LOG_LEVEL, config.LOG_JSON)
+    await register_webhook(dispatcher)
+
     await Tortoise.init(TORTOISE_ORM)
+    if config.METRICS_ENABLED:
+        instrument_queries()
+    advert_cache.configure(config.ADVERT_CACHE_SIZE, config.ADVERT_CACHE_TTL)
+    verified_init_data.configure(config.AUTH_CACHE_SIZE, config.INIT_DATA_MAX_AGE)
+    user_cache.configure(config.AUTH_CACHE_SIZE, config.USER_CACHE_TTL)
+    known_users.configure(config.AUTH_CACHE_SIZE, config.KNOWN_USER_TTL)
+    await advert_search.prepare()
+    await hub.start(config.WS_MAX_PENDING, config.WS_SEND_TIMEOUT)
+    await presence.start(config.PRESENCE_TTL, config.PRESENCE_FLUSH_INTERVAL)
+    await counter_reconciler.start(config.COUNTER_RECONCILE_INTERVAL)
+    await facet_rebuilder.start(config.FACETS_REBUILD_INTERVAL)
+    await change_pruner.start(config.SYNC_RETENTION_DAYS, config.SYNC_PRUNE_INTERVAL)
+    await message_archiver.start(config.ARCHIVE_AFTER_DAYS, config.ARCHIVE_INACTIVE_DAYS, config.ARCHIVE_INTERVAL)
+    await update_queue.start(
+        lambda update: dispatcher.feed_update(bot, update),
+        config.WEBHOOK_WORKERS,
+        config.WEBHOOK_QUEUE_SIZE
+    )
+    await notifier.start(
+        bot,
+        config.NOTIFY_GLOBAL_RATE,
+        config.NOTIFY_CHAT_INTERVAL,
+        config.NOTIFY_CONCURRENCY,
+        config.NOTIFY_MAX_PENDING
+    )
 
     yield
+    await update_queue.stop(config.WEBHOOK_DRAIN_TIMEOUT)
+    await notifier.stop(config.NOTIFY_DRAIN_TIMEOUT)
+    await counter_reconciler.stop()
+    await facet_rebuilder.stop()
+    await change_pruner.stop()
+    await message_archiver.stop()
+    await presence.stop()
+    await hub.stop()
     await Tortoise.close_connections()
     await bot.session.close()
+    log_listener.stop()
+    instance_lock.release()
 
 config = Config()
 
-bot = Bot(config.BOT_TOKEN.get_secret_value())
-dp = Dispatcher()
-app = FastAPI(lifespan=lifespan)
+# BOT_API_URL points the bot at a self-hosted or fake Bot API server.
+bot = Bot(
+    config.BOT_TOKEN.get_secret_value(),
+    session=AiohttpSession(api=TelegramAPIServer.from_base(config.BOT_API_URL)) if config.BOT_API_URL else None
+)
+
+def pooled(url: SecretStr) -> str:
+    return pooled_db_url(url.get_secret_value(), config.DB_POOL_MIN, config.DB_POOL_SIZE, config.DB_POOL_TIMEOUT)
+
 
 TORTOISE_ORM = {
-    "connections": {"default": config.DB_URL.get_secret_value()},
+    "connections": {"default": pooled(config.DB_URL)},
     "apps": {
         "models": {
-            "models": ["db.models.user", "db.models.adverts", "db.models.chat", "aerich.models"],
+            "models": ["db.models.user", "db.models.adverts", "db.models.chat", "db.models.sync", "aerich.models"],
             "default_connection": "default",
         },
     },
 }
 
+if config.DB_REPLICA_URL is not None:
+    TORTOISE_ORM["connections"][REPLICA_CONNECTION] = pooled(config.DB_REPLICA_URL)
+    TORTOISE_ORM["routers"] = ["db.routing.ReadReplicaRouter"]
@@ -1,3 +1,4 @@
 from .models.user import User, UserSchema
-from .models.adverts import Advert, AdvertSchema
-from .models.chat import Chat, ChatSchema, UserStatus, UserStatusSchema, Message, MessageSchema
\ No newline at end of file
+from .models.adverts import Advert, AdvertSchema, Booking, BookingSchema, CategoryFacet, PriceBucket
+from .models.chat import Chat, ChatSchema, UserStatus, UserStatusSchema, Message, MessageSchema, MessageArchive, ChatSummary, ChatSummarySchema
+from .models.sync import Change
\ No newline at end of file
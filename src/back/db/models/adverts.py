@@ -15,10 +15,60 @@ class Advert(Model):
     deposit = fields.IntField()
     category = fields.CharField(128)
     available = fields.BooleanField(default=True)
+    latitude = fields.FloatField(null=True)
+    longitude = fields.FloatField(null=True)
+    geo_cell = fields.IntField(null=True)
       
       
     class Meta:
         table = "adverts"
+        indexes = (
+            ("category", "id"),
+            ("price", "id"),
+            ("category", "price", "id"),
+            ("available", "id"),
+            ("owner_id", "created_at"),
+            ("geo_cell", "id"),
+        )
 
 
-AdvertSchema = pydantic_model_creator(Advert)
\ No newline at end of file
+class CategoryFacet(Model):
+    id = fields.IntField(pk=True)
+    category = fields.CharField(128, unique=True)
+    total = fields.IntField(default=0)
+    available = fields.IntField(default=0)
+    price_min = fields.IntField(null=True)
+    price_max = fields.IntField(null=True)
+
+    class Meta:
+        table = "category_facets"
+
+
+class PriceBucket(Model):
+    id = fields.IntField(pk=True)
+    category = fields.CharField(128)
+    bucket = fields.IntField()
+    count = fields.IntField(default=0)
+
+    class Meta:
+        table = "price_buckets"
+        unique_together = (("category", "bucket"),)
+
+
+class Booking(Model):
+    id = fields.IntField(pk=True)
+    advert_id = fields.IntField()
+    user_id = fields.BigIntField(null=True)
+    starts_on = fields.DateField()
+    ends_on = fields.DateField()
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "bookings"
+        indexes = (
+            ("advert_id", "starts_on", "ends_on"),
+        )
+
+
+AdvertSchema = pydantic_model_creator(Advert)
+BookingSchema = pydantic_model_creator(Booking)
\ No newline at end of file
@@ -1,6 +1,7 @@
 from tortoise import fields
 from tortoise.models import Model
 from tortoise.contrib.pydantic import pydantic_model_creator
+from tortoise.indexes import PartialIndex
 from datetime import datetime
 from typing import List, Optional
 
@@ -12,11 +13,18 @@ class Chat(Model):
     user2_id = fields.BigIntField()
     user1_name = fields.CharField(64)
     user2_name = fields.CharField(64)
+    # Id of the newest message moved to message_archives, if any.
+    archived_until = fields.IntField(null=True)
     created_at = fields.DatetimeField(auto_now_add=True)
     updated_at = fields.DatetimeField(auto_now=True)
     
     class Meta:
         table = "chats"
+        indexes = (
+            ("user1_id",),
+            ("user2_id",),
+            ("advert_id", "user1_id", "user2_id"),
+        )
 
 
 class Message(Model):
@@ -29,6 +37,41 @@ class Message(Model):
     
     class Meta:
         table = "messages"
+        indexes = (
+            ("chat_id", "id"),
+            PartialIndex(fields=("chat_id", "sender_id"), condition={"read": False}, name="messages_unread_idx"),
+        )
+
+
+class MessageArchive(Model):
+    # One compressed segment of a chat's oldest messages, ids first_id..last_id.
+    id = fields.IntField(pk=True)
+    chat_id = fields.IntField()
+    first_id = fields.IntField()
+    last_id = fields.IntField()
+    count = fields.IntField()
+    data = fields.BinaryField()
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "message_archives"
+        indexes = (("chat_id", "last_id"),)
+
+
+class ChatSummary(Model):
+    id = fields.IntField(pk=True)
+    chat_id = fields.IntField()
+    user_id = fields.BigIntField()
+    last_message_id = fields.IntField(null=True)
+    last_message_text = fields.TextField(null=True)
+    last_message_at = fields.DatetimeField(null=True)
+    unread_count = fields.IntField(default=0)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "chat_summaries"
+        unique_together = (("chat_id", "user_id"),)
+        indexes = (("user_id", "chat_id"),)
 
 
 class UserStatus(Model):
@@ -44,4 +87,5 @@ class UserStatus(Model):
 
 ChatSchema = pydantic_model_creator(Chat)
 MessageSchema = pydantic_model_creator(Message)
+ChatSummarySchema = pydantic_model_creator(ChatSummary)
 UserStatusSchema = pydantic_model_creator(UserStatus)
\ No newline at end of file
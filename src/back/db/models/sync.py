@@ -0,0 +1,19 @@
+from tortoise import fields
+from tortoise.models import Model
+
+
+class Change(Model):
+    id = fields.BigIntField(pk=True)
+    entity = fields.CharField(16)
+    entity_id = fields.BigIntField()
+    chat_id = fields.IntField(null=True)
+    user_id = fields.BigIntField(null=True)
+    deleted = fields.BooleanField(default=False)
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "changes"
+        indexes = (
+            ("chat_id", "id"),
+            ("entity", "id"),
+        )
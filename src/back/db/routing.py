@@ -0,0 +1,44 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional, Type
+
+from tortoise import BaseDBAsyncClient, connections
+from tortoise.exceptions import ConfigurationError
+from tortoise.models import Model
+
+
+REPLICA_CONNECTION = "replica"
+
+_replica_reads: ContextVar[bool] = ContextVar("replica_reads", default=False)
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model: Type[Model]) -> Optional[str]:
+        if _replica_reads.get():
+            return REPLICA_CONNECTION
+        return None
+
+    def db_for_write(self, model: Type[Model]) -> Optional[str]:
+        return None
+
+
+def read_connection() -> BaseDBAsyncClient:
+    if _replica_reads.get():
+        try:
+            return connections.get(REPLICA_CONNECTION)
+        except ConfigurationError:
+            pass
+    return connections.get("default")
+
+
+async def replica_reads() -> None:
+    _replica_reads.set(True)
+
+
+@contextmanager
+def use_primary() -> Iterator[None]:
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
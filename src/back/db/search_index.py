@@ -0,0 +1,38 @@
+import logging
+
+from tortoise import Tortoise, run_async
+
+
+# Tortoise cannot declare an expression GIN index in model Meta, so the
+# full-text index is created here once per database instead of at startup.
+SEARCH_DOCUMENT = "to_tsvector('russian', title || ' ' || description)"
+SEARCH_INDEX_NAME = "adverts_search_idx"
+
+# CONCURRENTLY keeps adverts writable while the index builds; it cannot run
+# inside a transaction.
+SEARCH_INDEX_SQL = (
+    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {SEARCH_INDEX_NAME} "
+    f"ON adverts USING GIN ({SEARCH_DOCUMENT})"
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    # Imported here: services.search reads the constants above while
+    # config_reader itself is still being imported.
+    from config_reader import TORTOISE_ORM
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    await Tortoise.init(TORTOISE_ORM)
+    connection = Tortoise.get_connection("default")
+    if connection.capabilities.dialect != "postgres":
+        logger.info("Full-text index is only used on PostgreSQL, nothing to do")
+    else:
+        await connection.execute_script(SEARCH_INDEX_SQL)
+        logger.info("Created %s", SEARCH_INDEX_NAME)
+    await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    run_async(main())
@@ -0,0 +1,150 @@
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from tortoise import Tortoise, run_async
+from tortoise.expressions import F, Subquery
+from tortoise.functions import Count, Max
+from tortoise.transactions import in_transaction
+
+from .models.chat import Chat, ChatSummary, Message
+from config_reader import TORTOISE_ORM
+
+
+REBUILD_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+def participants(chat: Chat) -> List[Tuple[int, int]]:
+    # (user, partner) pairs; a chat with oneself gets a single summary row,
+    # otherwise the second one would break the (chat_id, user_id) constraint.
+    if chat.user1_id == chat.user2_id:
+        return [(chat.user1_id, chat.user2_id)]
+    return [(chat.user1_id, chat.user2_id), (chat.user2_id, chat.user1_id)]
+
+
+async def create_summaries(chat: Chat) -> None:
+    await ChatSummary.bulk_create([
+        ChatSummary(chat_id=chat.id, user_id=user_id) for user_id, _ in participants(chat)
+    ])
+
+
+async def record_message(message: Message) -> None:
+    await record_messages([message])
+
+
+async def record_messages(messages: Iterable[Message]) -> None:
+    by_chat: Dict[int, List[Message]] = defaultdict(list)
+    for message in messages:
+        by_chat[message.chat_id].append(message)
+
+    for chat_id, chat_messages in by_chat.items():
+        last_message = max(chat_messages, key=lambda message: message.id)
+        await ChatSummary.filter(chat_id=chat_id).update(
+            last_message_id=last_message.id,
+            last_message_text=last_message.text,
+            last_message_at=last_message.created_at
+        )
+        for sender_id, sent in Counter(message.sender_id for message in chat_messages).items():
+            await ChatSummary.filter(
+                chat_id=chat_id
+            ).exclude(user_id=sender_id).update(unread_count=F("unread_count") + sent)
+
+
+async def recount_unread(chat_ids: Iterable[int], user_id: int) -> None:
+    chat_ids = list(chat_ids)
+    rows = await (
+        Message.filter(chat_id__in=chat_ids, read=False)
+        .exclude(sender_id=user_id)
+        .annotate(unread=Count("id"))
+        .group_by("chat_id")
+        .values_list("chat_id", "unread")
+    )
+    unread_by_chat = dict(rows)
+
+    cleared = [chat_id for chat_id in chat_ids if not unread_by_chat.get(chat_id)]
+    if cleared:
+        await ChatSummary.filter(chat_id__in=cleared, user_id=user_id).update(unread_count=0)
+    for chat_id, unread in unread_by_chat.items():
+        await ChatSummary.filter(chat_id=chat_id, user_id=user_id).update(unread_count=unread)
+
+
+async def reset_unread(chat_id: int, user_id: int) -> None:
+    await ChatSummary.filter(chat_id=chat_id, user_id=user_id).update(unread_count=0)
+
+
+async def rebuild_summaries(chat_ids: Iterable[int]) -> int:
+    chats = await Chat.filter(id__in=list(chat_ids))
+    if not chats:
+        return 0
+
+    ids = [chat.id for chat in chats]
+
+    last_messages = await Message.filter(
+        id__in=Subquery(
+            Message.filter(chat_id__in=ids)
+            .annotate(last_id=Max("id"))
+            .group_by("chat_id")
+            .values("last_id")
+        )
+    )
+    last_by_chat = {message.chat_id: message for message in last_messages}
+
+    unread_rows = await (
+        Message.filter(chat_id__in=ids, read=False)
+        .annotate(unread=Count("id"))
+        .group_by("chat_id", "sender_id")
+        .values("chat_id", "sender_id", "unread")
+    )
+    sent_unread = {(row["chat_id"], row["sender_id"]): row["unread"] for row in unread_rows}
+
+    summaries = []
+    for chat in chats:
+        last_message = last_by_chat.get(chat.id)
+        for user_id, partner_id in participants(chat):
+            summaries.append(ChatSummary(
+                chat_id=chat.id,
+                user_id=user_id,
+                last_message_id=last_message.id if last_message else None,
+                last_message_text=last_message.text if last_message else None,
+                last_message_at=last_message.created_at if last_message else None,
+                unread_count=sent_unread.get((chat.id, partner_id), 0)
+            ))
+
+    async with in_transaction("default"):
+        await ChatSummary.filter(chat_id__in=ids).delete()
+        await ChatSummary.bulk_create(summaries)
+
+    return len(chats)
+
+
+async def rebuild_all_summaries(batch_size: int = REBUILD_BATCH_SIZE) -> int:
+    rebuilt = 0
+    last_id = 0
+
+    while True:
+        ids: List[int] = await (
+            Chat.filter(id__gt=last_id)
+            .order_by("id")
+            .limit(batch_size)
+            .values_list("id", flat=True)
+        )
+        if not ids:
+            break
+
+        rebuilt += await rebuild_summaries(ids)
+        last_id = ids[-1]
+
+    return rebuilt
+
+
+async def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    await Tortoise.init(TORTOISE_ORM)
+    rebuilt = await rebuild_all_summaries()
+    logger.info("Rebuilt summaries for %d chats", rebuilt)
+
+
+if __name__ == "__main__":
+    run_async(main())
@@ -0,0 +1,48 @@
+from aiogram import Dispatcher
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+from bot.handlers import setup_routers as setup_bot
+from api import setup_routers as setup_api
+
+from config_reader import config, lifespan
+from services.log import RequestLogMiddleware, UpdateLogContext
+from services.metrics import MetricsMiddleware
+
+
+def create_dispatcher() -> Dispatcher:
+    # Routers can only be attached to one parent, so every app builds its
+    # own dispatcher and bot router tree.
+    dispatcher = Dispatcher()
+    dispatcher.update.outer_middleware(UpdateLogContext())
+    dispatcher.include_router(setup_bot())
+    return dispatcher
+
+
+def create_app() -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
+    app.state.dispatcher = create_dispatcher()
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["*"]
+    )
+    if config.METRICS_ENABLED:
+        app.add_middleware(
+            MetricsMiddleware,
+            server_timing=config.METRICS_SERVER_TIMING,
+            query_threshold=config.METRICS_QUERY_THRESHOLD
+        )
+    # Added last so it wraps everything and the request id is set first.
+    app.add_middleware(
+        RequestLogMiddleware,
+        sample_rates=config.LOG_SAMPLE_RATES,
+        default_rate=config.LOG_SAMPLE_DEFAULT
+    )
+
+    app.include_router(setup_api())
+    return app
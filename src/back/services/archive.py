@@ -0,0 +1,191 @@
+import logging
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional
+
+from tortoise.expressions import Q
+from tortoise.functions import Max, Min
+from tortoise.transactions import in_transaction
+
+from db import Chat, ChatSummary, Message, MessageArchive
+from services.periodic import PeriodicTask
+from services.serialization import dumps, loads
+
+
+ARCHIVE_SEGMENT_SIZE = 500
+ARCHIVE_CHECK_BATCH = 1000
+COMPRESSION_LEVEL = 6
+
+logger = logging.getLogger(__name__)
+
+
+def pack_messages(messages: List[Message]) -> bytes:
+    rows = [[m.id, m.sender_id, m.text, m.created_at.isoformat()] for m in messages]
+    return zlib.compress(dumps(rows), COMPRESSION_LEVEL)
+
+
+def unpack_messages(segment: MessageArchive) -> List[Message]:
+    # Only read messages are archived, see archive_chat.
+    return [
+        Message(
+            id=message_id,
+            chat_id=segment.chat_id,
+            sender_id=sender_id,
+            text=text,
+            created_at=datetime.fromisoformat(created_at),
+            read=True
+        )
+        for message_id, sender_id, text, created_at in loads(zlib.decompress(segment.data))
+    ]
+
+
+async def archived_messages(
+    chat_id: int,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = 50
+) -> List[Message]:
+    # The archive holds a prefix of the chat's history, so it is only
+    # reached when a page runs past the oldest live message.
+    segments = MessageArchive.filter(chat_id=chat_id)
+    if after_id is not None:
+        segments = segments.filter(last_id__gt=after_id).order_by("last_id")
+    else:
+        if before_id is not None:
+            segments = segments.filter(first_id__lt=before_id)
+        segments = segments.order_by("-last_id")
+
+    # Pick segments by their counts first so only the blobs the page needs
+    # are loaded; the first one may be cut by the cursor, so it is not counted.
+    needed: List[int] = []
+    total = 0
+    for segment_id, count in await segments.values_list("id", "count"):
+        needed.append(segment_id)
+        if len(needed) > 1:
+            total += count
+        if total >= limit:
+            break
+    if not needed:
+        return []
+
+    messages: List[Message] = []
+    for segment in await MessageArchive.filter(id__in=needed).order_by("first_id"):
+        messages.extend(
+            m for m in unpack_messages(segment)
+            if (after_id is None or m.id > after_id) and (before_id is None or m.id < before_id)
+        )
+
+    return messages[:limit] if after_id is not None else messages[-limit:]
+
+
+async def archive_chat(chat_id: int, cutoff: datetime, segment_size: int = ARCHIVE_SEGMENT_SIZE) -> int:
+    # Everything below the first unread or recent message goes, except the
+    # last message, which summaries are rebuilt from. Unread messages stay
+    # live so the unread counters and mark-read keep working on one table.
+    keep = await (
+        Message.filter(Q(created_at__gte=cutoff) | Q(read=False), chat_id=chat_id)
+        .order_by("id").limit(1).values_list("id", flat=True)
+    )
+    last = await Message.filter(chat_id=chat_id).order_by("-id").limit(1).values_list("id", flat=True)
+    if not last:
+        return 0
+    boundary = min(keep + last)
+
+    archived = 0
+    while True:
+        async with in_transaction("default"):
+            batch = await Message.filter(chat_id=chat_id, id__lt=boundary).order_by("id").limit(segment_size)
+            if not batch:
+                return archived
+            ids = [message.id for message in batch]
+            await MessageArchive.create(
+                chat_id=chat_id,
+                first_id=ids[0],
+                last_id=ids[-1],
+                count=len(ids),
+                data=pack_messages(batch)
+            )
+            await Chat.filter(id=chat_id).update(archived_until=ids[-1])
+            # Another worker archiving the same chat would leave duplicate
+            # segments; roll back if it got to these rows first.
+            if await Message.filter(id__in=ids).delete() != len(ids):
+                raise RuntimeError(f"Messages of chat {chat_id} changed while archiving")
+        archived += len(ids)
+
+
+async def archivable_chats(chat_ids: Iterable[int], cutoff: datetime) -> List[int]:
+    # archive_chat moves a prefix of the chat up to its first unread or recent
+    # message and always keeps the last one, so a chat has work only when its
+    # oldest live message is read, old and not the last. Checked in batches,
+    # so chats archived on earlier ticks cost no per-chat queries.
+    chat_ids = list(chat_ids)
+    ready: List[int] = []
+    for start in range(0, len(chat_ids), ARCHIVE_CHECK_BATCH):
+        bounds = await (
+            Message.filter(chat_id__in=chat_ids[start:start + ARCHIVE_CHECK_BATCH])
+            .annotate(first_id=Min("id"), last_id=Max("id"))
+            .group_by("chat_id")
+            .values_list("first_id", "last_id")
+        )
+        first_ids = [first_id for first_id, last_id in bounds if first_id < last_id]
+        if first_ids:
+            ready += await Message.filter(
+                id__in=first_ids, read=True, created_at__lt=cutoff
+            ).values_list("chat_id", flat=True)
+    return ready
+
+
+async def archive_messages(
+    older_than: timedelta,
+    inactive_for: timedelta,
+    segment_size: int = ARCHIVE_SEGMENT_SIZE
+) -> int:
+    now = datetime.now(timezone.utc)
+    chat_ids = await (
+        ChatSummary.annotate(last_at=Max("last_message_at"))
+        .group_by("chat_id")
+        .filter(last_at__lt=now - inactive_for)
+        .values_list("chat_id", flat=True)
+    )
+
+    chat_ids = await archivable_chats(chat_ids, now - older_than)
+
+    archived = 0
+    for chat_id in chat_ids:
+        archived += await archive_chat(chat_id, now - older_than, segment_size)
+    if archived:
+        logger.info("Archived %d messages from %d chats", archived, len(chat_ids))
+    return archived
+
+
+class MessageArchiver(PeriodicTask):
+    def __init__(
+        self,
+        older_than_days: float = 90.0,
+        inactive_days: float = 30.0,
+        interval: float = 3600.0
+    ) -> None:
+        super().__init__(interval)
+        self.older_than_days = older_than_days
+        self.inactive_days = inactive_days
+
+    async def start(
+        self,
+        older_than_days: Optional[float] = None,
+        inactive_days: Optional[float] = None,
+        interval: Optional[float] = None
+    ) -> None:
+        if older_than_days is not None:
+            self.older_than_days = older_than_days
+        if inactive_days is not None:
+            self.inactive_days = inactive_days
+        await super().start(interval)
+
+    async def tick(self) -> None:
+        await archive_messages(
+            timedelta(days=self.older_than_days),
+            timedelta(days=self.inactive_days)
+        )
+
+
+message_archiver = MessageArchiver()
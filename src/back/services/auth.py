@@ -0,0 +1,100 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+from aiogram.utils.web_app import WebAppInitData
+
+from db import User
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    def __init__(self, max_entries: int = 4096, ttl: float = 30.0) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[K, Tuple[float, V]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def configure(self, max_entries: Optional[int] = None, ttl: Optional[float] = None) -> None:
+        if max_entries is not None:
+            self.max_entries = max_entries
+        if ttl is not None:
+            self.ttl = ttl
+        self._evict_overflow()
+
+    def get(self, key: K) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: K, value: V, expires_at: Optional[float] = None) -> None:
+        if expires_at is None:
+            expires_at = time.time() + self.ttl
+        self._entries.pop(key, None)
+        self._entries[key] = (expires_at, value)
+        self._evict_overflow()
+
+    def invalidate(self, key: K) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _evict_overflow(self) -> None:
+        while len(self._entries) > max(self.max_entries, 0):
+            self._entries.popitem(last=False)
+
+
+class InitDataCache(TTLCache[str, WebAppInitData]):
+    def __init__(self, max_entries: int = 4096, max_age: float = 86400.0) -> None:
+        super().__init__(max_entries, max_age)
+
+    def expires_at(self, data: WebAppInitData) -> float:
+        return data.auth_date.timestamp() + self.ttl
+
+    def is_expired(self, data: WebAppInitData) -> bool:
+        return self.expires_at(data) <= time.time()
+
+    def remember(self, raw: str, data: WebAppInitData) -> None:
+        self.put(raw, data, self.expires_at(data))
+
+
+verified_init_data = InitDataCache()
+user_cache: TTLCache[int, User] = TTLCache()
+# Profile fields last seen in the database per user, filled by /start and by
+# check_user, so a repeated /start with unchanged data writes nothing.
+known_users: TTLCache[int, Tuple[str, str]] = TTLCache(ttl=3600.0)
+
+
+async def upsert_user(user_id: int, name: str, username: str) -> bool:
+    profile = (name[:64], username[:128])
+    if known_users.get(user_id) == profile:
+        return False
+
+    # One INSERT ... ON CONFLICT DO UPDATE instead of exists() + create(),
+    # which also keeps concurrent /start updates from hitting the primary key.
+    await User.bulk_create(
+        [User(id=user_id, name=profile[0], username=profile[1])],
+        on_conflict=("id",),
+        update_fields=("name", "username")
+    )
+    known_users.put(user_id, profile)
+    user_cache.invalidate(user_id)
+    return True
@@ -0,0 +1,142 @@
+import hashlib
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Set
+
+from services.serialization import dumps
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+    tags: FrozenSet[str]
+    expires_at: float
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 30.0) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = defaultdict(set)
+        self._generation = 0
+        self._invalidated_at = float("-inf")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def invalidated_within(self, seconds: float) -> bool:
+        return time.monotonic() - self._invalidated_at < seconds
+
+    def configure(self, max_entries: Optional[int] = None, ttl: Optional[float] = None) -> None:
+        if max_entries is not None:
+            self.max_entries = max_entries
+        if ttl is not None:
+            self.ttl = ttl
+        self._evict_overflow()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, content: Any, tags: Iterable[str], generation: int) -> CachedResponse:
+        body = dumps(content)
+        entry = CachedResponse(
+            body=body,
+            etag=make_etag(body),
+            tags=frozenset(tags),
+            expires_at=time.monotonic() + self.ttl
+        )
+        # An invalidation that ran while the response was being built means
+        # the content may already be stale, so serve it once but don't keep it.
+        if generation != self._generation or self.max_entries <= 0:
+            return entry
+
+        self._drop(key)
+        self._entries[key] = entry
+        for tag in entry.tags:
+            self._tags[tag].add(key)
+        self._evict_overflow()
+        return entry
+
+    def invalidate(self, *tags: str) -> int:
+        self._generation += 1
+        self._invalidated_at = time.monotonic()
+        keys = set()
+        for tag in tags:
+            keys |= self._tags.pop(tag, set())
+        for key in keys:
+            self._drop(key)
+        self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+        self._tags.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+    def _evict_overflow(self) -> None:
+        while len(self._entries) > max(self.max_entries, 0):
+            key = next(iter(self._entries))
+            self._drop(key)
+            self.evictions += 1
+
+
+advert_cache = ResponseCache()
@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from tortoise.expressions import Q
+from tortoise.queryset import QuerySet
+
+from db import Advert
+
+
+LISTING_PAGE_SIZE = 50
+LISTING_PAGE_MAX = 100
+
+SORT_ORDERINGS = {
+    "newest": ("-id",),
+    "cheapest": ("price", "id"),
+}
+
+
+def _parse_bool(value: str) -> bool:
+    lowered = value.lower()
+    if lowered in ("1", "true", "yes"):
+        return True
+    if lowered in ("0", "false", "no"):
+        return False
+    raise ValueError(f"Invalid boolean value: {value}")
+
+
+@dataclass(frozen=True)
+class ListingQuery:
+    category: Optional[str] = None
+    min_price: Optional[int] = None
+    max_price: Optional[int] = None
+    available: Optional[bool] = None
+    owner_id: Optional[int] = None
+    sort: str = "newest"
+    cursor: Optional[str] = None
+    limit: int = LISTING_PAGE_SIZE
+
+    @classmethod
+    def from_params(cls, params: Mapping[str, str]) -> "ListingQuery":
+        sort = params.get("sort", "newest")
+        if sort not in SORT_ORDERINGS:
+            raise ValueError(f"Unknown sort: {sort}")
+
+        def optional_int(name: str) -> Optional[int]:
+            value = params.get(name)
+            return int(value) if value not in (None, "") else None
+
+        available = params.get("available")
+        limit = optional_int("limit") or LISTING_PAGE_SIZE
+
+        return cls(
+            category=params.get("category") or None,
+            min_price=optional_int("min_price"),
+            max_price=optional_int("max_price"),
+            available=_parse_bool(available) if available not in (None, "") else None,
+            owner_id=optional_int("owner_id"),
+            sort=sort,
+            cursor=params.get("cursor") or None,
+            limit=max(1, min(limit, LISTING_PAGE_MAX))
+        )
+
+    def _decode_cursor(self) -> Tuple[int, ...]:
+        try:
+            values = tuple(int(part) for part in self.cursor.split(":"))
+        except ValueError:
+            raise ValueError(f"Invalid cursor: {self.cursor}")
+        if len(values) != len(SORT_ORDERINGS[self.sort]):
+            raise ValueError(f"Invalid cursor: {self.cursor}")
+        return values
+
+    def filtered(self) -> QuerySet[Advert]:
+        queryset = Advert.all()
+        if self.category is not None:
+            queryset = queryset.filter(category=self.category)
+        if self.min_price is not None:
+            queryset = queryset.filter(price__gte=self.min_price)
+        if self.max_price is not None:
+            queryset = queryset.filter(price__lte=self.max_price)
+        if self.available is not None:
+            queryset = queryset.filter(available=self.available)
+        if self.owner_id is not None:
+            queryset = queryset.filter(owner_id=self.owner_id)
+        return queryset
+
+    def queryset(self) -> QuerySet[Advert]:
+        queryset = self.filtered()
+
+        if self.cursor:
+            if self.sort == "newest":
+                (last_id,) = self._decode_cursor()
+                queryset = queryset.filter(id__lt=last_id)
+            else:
+                last_price, last_id = self._decode_cursor()
+                queryset = queryset.filter(
+                    Q(price__gt=last_price) | Q(price=last_price, id__gt=last_id)
+                )
+
+        return queryset.order_by(*SORT_ORDERINGS[self.sort]).limit(self.limit + 1)
+
+    def paginate(self, rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        if len(rows) <= self.limit:
+            return rows, None
+
+        page = rows[:self.limit]
+        last = page[-1]
+        if self.sort == "newest":
+            return page, str(last["id"])
+        return page, f"{last['price']}:{last['id']}"
@@ -0,0 +1,78 @@
+from typing import Dict, List, Tuple, Type
+
+from tortoise.expressions import F
+from tortoise.functions import Count
+from tortoise.models import Model
+
+from db import Advert, User
+from services.periodic import PeriodicTask
+
+
+RECONCILE_BATCH_SIZE = 500
+
+# User counter field -> (source model, column holding the user id). Deals get
+# an entry here once they are stored in their own table.
+COUNTER_SOURCES: Dict[str, Tuple[Type[Model], str]] = {
+    "adverts": (Advert, "owner_id"),
+}
+
+
+async def adjust_counter(user_id: int, field: str, delta: int) -> int:
+    return await User.filter(id=user_id).update(**{field: F(field) + delta})
+
+
+async def reconcile_batch(user_ids: List[int]) -> int:
+    users = await User.filter(id__in=user_ids).values("id", *COUNTER_SOURCES)
+
+    actual: Dict[str, Dict[int, int]] = {}
+    for field, (model, owner_field) in COUNTER_SOURCES.items():
+        rows = await (
+            model.filter(**{f"{owner_field}__in": user_ids})
+            .annotate(total=Count("id"))
+            .group_by(owner_field)
+            .values_list(owner_field, "total")
+        )
+        actual[field] = dict(rows)
+
+    fixed = 0
+    for user in users:
+        for field in COUNTER_SOURCES:
+            value = actual[field].get(user["id"], 0)
+            if user[field] == value:
+                continue
+            # Compare-and-set so a concurrent F() increment is never overwritten;
+            # if the row moved on, the next run picks it up.
+            fixed += await User.filter(id=user["id"], **{field: user[field]}).update(**{field: value})
+    return fixed
+
+
+async def reconcile_counters(batch_size: int = RECONCILE_BATCH_SIZE) -> int:
+    fixed = 0
+    last_id = 0
+
+    while True:
+        ids: List[int] = await (
+            User.filter(id__gt=last_id)
+            .order_by("id")
+            .limit(batch_size)
+            .values_list("id", flat=True)
+        )
+        if not ids:
+            break
+
+        fixed += await reconcile_batch(ids)
+        last_id = ids[-1]
+
+    return fixed
+
+
+class CounterReconciler(PeriodicTask):
+    def __init__(self, interval: float = 3600.0) -> None:
+        super().__init__(interval)
+        self.last_fixed = 0
+
+    async def tick(self) -> None:
+        self.last_fixed = await reconcile_counters()
+
+
+counter_reconciler = CounterReconciler()
@@ -0,0 +1,161 @@
+from bisect import bisect_right
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from tortoise.expressions import F, Q
+from tortoise.functions import Count, Max, Min
+from tortoise.models import Model
+from tortoise.transactions import in_transaction
+
+from db import Advert, CategoryFacet, PriceBucket
+from services.periodic import PeriodicTask
+
+
+# Lower bounds of the price histogram buckets; the last one is open-ended.
+PRICE_BUCKETS = (0, 250, 500, 1000, 2000, 5000, 10000)
+
+# (category, price, available) of an advert, the fields the facets depend on.
+FacetKey = Tuple[str, int, bool]
+
+
+def facet_key(advert: Advert) -> FacetKey:
+    return advert.category, advert.price, bool(advert.available)
+
+
+def price_bucket(price: int) -> int:
+    return max(bisect_right(PRICE_BUCKETS, price) - 1, 0)
+
+
+async def _update_or_create(model: Type[Model], lookup: Dict[str, Any], changes: Dict[str, Any]) -> None:
+    if await model.filter(**lookup).update(**changes):
+        return
+    # First advert in this category or bucket; ignore_conflicts covers a
+    # concurrent insert of the same row.
+    await model.bulk_create([model(**lookup)], ignore_conflicts=True)
+    await model.filter(**lookup).update(**changes)
+
+
+async def _refresh_bounds(category: str) -> None:
+    rows = await (
+        Advert.filter(category=category)
+        .annotate(low=Min("price"), high=Max("price"))
+        .values("low", "high")
+    )
+    low, high = (rows[0]["low"], rows[0]["high"]) if rows else (None, None)
+    await CategoryFacet.filter(category=category).update(price_min=low, price_max=high)
+
+
+async def _adjust(key: FacetKey, delta: int) -> None:
+    category, price, available = key
+    changes = {"total": F("total") + delta}
+    if available:
+        changes["available"] = F("available") + delta
+    await _update_or_create(CategoryFacet, {"category": category}, changes)
+    await _update_or_create(
+        PriceBucket,
+        {"category": category, "bucket": price_bucket(price)},
+        {"count": F("count") + delta}
+    )
+
+    if delta > 0:
+        await CategoryFacet.filter(
+            Q(price_min__isnull=True) | Q(price_min__gt=price), category=category
+        ).update(price_min=price)
+        await CategoryFacet.filter(
+            Q(price_max__isnull=True) | Q(price_max__lt=price), category=category
+        ).update(price_max=price)
+    else:
+        # Removing the cheapest or the most expensive advert moves a bound;
+        # (category, price) is indexed, so re-reading it stays cheap.
+        bounds = await CategoryFacet.filter(category=category).values("price_min", "price_max")
+        if bounds and (
+            bounds[0]["price_min"] is None or price <= bounds[0]["price_min"] or price >= bounds[0]["price_max"]
+        ):
+            await _refresh_bounds(category)
+
+
+async def add_to_facets(key: FacetKey) -> None:
+    await _adjust(key, 1)
+
+
+async def remove_from_facets(key: FacetKey) -> None:
+    await _adjust(key, -1)
+
+
+async def update_facets(before: FacetKey, after: FacetKey) -> None:
+    if before != after:
+        await _adjust(before, -1)
+        await _adjust(after, 1)
+
+
+async def load_facets() -> Dict[str, Any]:
+    facets = await CategoryFacet.filter(total__gt=0).order_by("category")
+    histograms: Dict[str, List[int]] = {facet.category: [0] * len(PRICE_BUCKETS) for facet in facets}
+    for category, bucket, count in await PriceBucket.filter(count__gt=0).values_list("category", "bucket", "count"):
+        if category in histograms and 0 <= bucket < len(PRICE_BUCKETS):
+            histograms[category][bucket] = count
+
+    return {
+        "total": sum(facet.total for facet in facets),
+        "available": sum(facet.available for facet in facets),
+        "price_buckets": list(PRICE_BUCKETS),
+        "categories": [
+            {
+                "category": facet.category,
+                "total": facet.total,
+                "available": facet.available,
+                "price_min": facet.price_min,
+                "price_max": facet.price_max,
+                "histogram": histograms[facet.category],
+            }
+            for facet in facets
+        ],
+    }
+
+
+async def rebuild_facets() -> int:
+    rows = await (
+        Advert.annotate(adverts=Count("id"))
+        .group_by("category", "price", "available")
+        .values_list("category", "price", "available", "adverts")
+    )
+
+    facets: Dict[str, CategoryFacet] = {}
+    buckets: Counter = Counter()
+    for category, price, available, adverts in rows:
+        facet = facets.get(category)
+        if facet is None:
+            facet = facets[category] = CategoryFacet(
+                category=category, total=0, available=0, price_min=price, price_max=price
+            )
+        facet.total += adverts
+        if available:
+            facet.available += adverts
+        facet.price_min = min(facet.price_min, price)
+        facet.price_max = max(facet.price_max, price)
+        buckets[(category, price_bucket(price))] += adverts
+
+    async with in_transaction("default"):
+        await CategoryFacet.all().delete()
+        await PriceBucket.all().delete()
+        await CategoryFacet.bulk_create(list(facets.values()))
+        await PriceBucket.bulk_create([
+            PriceBucket(category=category, bucket=bucket, count=count)
+            for (category, bucket), count in buckets.items()
+        ])
+
+    return len(facets)
+
+
+class FacetRebuilder(PeriodicTask):
+    async def start(self, interval: Optional[float] = None) -> None:
+        # A fresh deployment has no facets yet, so don't wait a whole interval.
+        if not await CategoryFacet.exists() and await Advert.exists():
+            await rebuild_facets()
+        await super().start(interval)
+
+    async def tick(self) -> None:
+        await rebuild_facets()
+
+
+facet_rebuilder = FacetRebuilder()
@@ -0,0 +1,159 @@
+import math
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from tortoise.expressions import Q
+
+from db import Advert, Booking
+
+
+EARTH_RADIUS_KM = 6371.0
+# 0.1 degree cells are about 11 km tall; a 50 km radius touches a few
+# hundred of them at most, which still makes a small IN list.
+CELL_DEGREES = 0.1
+LON_CELLS = round(360 / CELL_DEGREES)
+LAT_CELLS = round(180 / CELL_DEGREES)
+
+NEARBY_RADIUS_KM = 5.0
+NEARBY_RADIUS_MAX_KM = 50.0
+NEARBY_PAGE_SIZE = 20
+NEARBY_PAGE_MAX = 100
+
+
+def parse_coordinates(latitude: Any, longitude: Any) -> Tuple[float, float]:
+    try:
+        lat, lon = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        raise ValueError("latitude and longitude must be numbers")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("Coordinates out of range")
+    return lat, lon
+
+
+def geo_cell(latitude: float, longitude: float) -> int:
+    row = min(int((latitude + 90) // CELL_DEGREES), LAT_CELLS - 1)
+    col = int((longitude + 180) // CELL_DEGREES) % LON_CELLS
+    return row * LON_CELLS + col
+
+
+def lat_span(radius_km: float) -> float:
+    return math.degrees(radius_km / EARTH_RADIUS_KM)
+
+
+def cells_within(latitude: float, longitude: float, radius_km: float) -> List[int]:
+    dlat = lat_span(radius_km)
+    # A degree of longitude shrinks towards the poles.
+    dlon = dlat / max(math.cos(math.radians(latitude)), 1e-6)
+
+    first_row = geo_cell(max(latitude - dlat, -90.0), longitude) // LON_CELLS
+    last_row = geo_cell(min(latitude + dlat, 90.0), longitude) // LON_CELLS
+    if dlon >= 180:
+        cols: Iterable[int] = range(LON_CELLS)
+    else:
+        first_col = int((longitude - dlon + 180) // CELL_DEGREES)
+        last_col = int((longitude + dlon + 180) // CELL_DEGREES)
+        cols = sorted({col % LON_CELLS for col in range(first_col, last_col + 1)})
+    return [row * LON_CELLS + col for row in range(first_row, last_row + 1) for col in cols]
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def parse_date_range(starts_on: Any, ends_on: Any) -> Tuple[date, date]:
+    try:
+        start, end = date.fromisoformat(str(starts_on)), date.fromisoformat(str(ends_on))
+    except ValueError:
+        raise ValueError("Dates must be in YYYY-MM-DD format")
+    if end < start:
+        raise ValueError("End date is before start date")
+    return start, end
+
+
+def overlapping(starts_on: date, ends_on: date) -> Q:
+    # Both ends are inclusive: a booking ending on the 5th blocks the 5th.
+    return Q(starts_on__lte=ends_on, ends_on__gte=starts_on)
+
+
+async def booked_adverts(advert_ids: List[int], starts_on: date, ends_on: date) -> Set[int]:
+    if not advert_ids:
+        return set()
+    rows = await Booking.filter(overlapping(starts_on, ends_on), advert_id__in=advert_ids).values_list("advert_id", flat=True)
+    return set(rows)
+
+
+@dataclass(frozen=True)
+class NearbyQuery:
+    latitude: float
+    longitude: float
+    radius_km: float = NEARBY_RADIUS_KM
+    starts_on: Optional[date] = None
+    ends_on: Optional[date] = None
+    category: Optional[str] = None
+    limit: int = NEARBY_PAGE_SIZE
+
+    @classmethod
+    def from_params(cls, params: Mapping[str, str]) -> "NearbyQuery":
+        latitude, longitude = parse_coordinates(params.get("lat"), params.get("lon"))
+        try:
+            radius_km = float(params.get("radius_km") or NEARBY_RADIUS_KM)
+            limit = int(params.get("limit") or NEARBY_PAGE_SIZE)
+        except ValueError:
+            raise ValueError("radius_km and limit must be numbers")
+        if radius_km <= 0:
+            raise ValueError("radius_km must be positive")
+
+        starts_on = ends_on = None
+        if params.get("date_from") or params.get("date_to"):
+            starts_on, ends_on = parse_date_range(
+                params.get("date_from"),
+                params.get("date_to") or params.get("date_from")
+            )
+
+        return cls(
+            latitude=latitude,
+            longitude=longitude,
+            radius_km=min(radius_km, NEARBY_RADIUS_MAX_KM),
+            starts_on=starts_on,
+            ends_on=ends_on,
+            category=params.get("category") or None,
+            limit=max(1, min(limit, NEARBY_PAGE_MAX))
+        )
+
+    async def run(self, fields: Tuple[str, ...]) -> List[Dict[str, Any]]:
+        # The cell index narrows the scan to the squares around the point;
+        # the exact distance is then checked on those candidates only.
+        dlat = lat_span(self.radius_km)
+        queryset = Advert.filter(
+            geo_cell__in=cells_within(self.latitude, self.longitude, self.radius_km),
+            latitude__gte=self.latitude - dlat,
+            latitude__lte=self.latitude + dlat,
+            available=True
+        )
+        if self.category is not None:
+            queryset = queryset.filter(category=self.category)
+
+        # Only coordinates are loaded for ranking; full rows for the page.
+        distances: Dict[int, float] = {}
+        for advert_id, latitude, longitude in await queryset.values_list("id", "latitude", "longitude"):
+            distance = distance_km(self.latitude, self.longitude, latitude, longitude)
+            if distance <= self.radius_km:
+                distances[advert_id] = distance
+
+        if self.starts_on is not None and distances:
+            for advert_id in await booked_adverts(list(distances), self.starts_on, self.ends_on):
+                del distances[advert_id]
+
+        page = sorted(distances, key=lambda advert_id: (distances[advert_id], advert_id))[:self.limit]
+        rows = {row["id"]: row for row in await Advert.filter(id__in=page).values(*fields)} if page else {}
+        result = []
+        for advert_id in page:
+            if advert_id in rows:
+                rows[advert_id]["distance_km"] = round(distances[advert_id], 3)
+                result.append(rows[advert_id])
+        return result
@@ -0,0 +1,40 @@
+import os
+import tempfile
+from typing import IO, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class InstanceLock:
+    # An exclusive flock held for the life of the process. A second worker
+    # started on the same port, e.g. by `uvicorn --workers N`, fails to take
+    # it. The kernel drops the lock when the process dies, so a crash or a
+    # --reload restart never leaves it stale.
+    def __init__(self) -> None:
+        self.path: Optional[str] = None
+        self._file: Optional[IO[str]] = None
+
+    def acquire(self, name: str) -> bool:
+        if fcntl is None or self._file is not None:
+            return True
+        self.path = os.path.join(tempfile.gettempdir(), f"{name}.lock")
+        lock_file = open(self.path, "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+
+    def release(self) -> None:
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+instance_lock = InstanceLock()
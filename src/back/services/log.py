@@ -0,0 +1,154 @@
+import copy
+import json
+import logging
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+REQUEST_ID_HEADER = "x-request-id"
+REQUEST_ID_MAX_LENGTH = 64
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+access_logger = logging.getLogger("access")
+
+# Attributes every LogRecord has; anything else was passed through `extra`.
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+
+class RequestIdFilter(logging.Filter):
+    # Runs in the emitting task, before the record crosses to the listener
+    # thread where the context variable is no longer visible.
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class LoopQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Same as the base class, but the traceback stays a separate field
+        # instead of being folded into the message.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level: str = "INFO", json_output: bool = True) -> QueueListener:
+    output = logging.StreamHandler(sys.stdout)
+    if json_output:
+        output.setFormatter(JSONFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    # Handlers on the event loop only enqueue; formatting and writes happen
+    # on the listener thread.
+    queue: SimpleQueue = SimpleQueue()
+    handler = LoopQueueHandler(queue)
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+
+    listener = QueueListener(queue, output)
+    listener.start()
+    return listener
+
+
+class RequestLogMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        sample_rates: Optional[Dict[str, float]] = None,
+        default_rate: float = 1.0
+    ) -> None:
+        self.app = app
+        self.sample_rates = sample_rates or {}
+        self.default_rate = default_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = Headers(scope=scope).get(REQUEST_ID_HEADER, "")[:REQUEST_ID_MAX_LENGTH]
+        current = incoming or uuid.uuid4().hex
+        token = request_id.set(current)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_id(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append(REQUEST_ID_HEADER, current)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            rate = self.sample_rates.get(route, self.default_rate)
+            # Failures are always kept; successful calls on noisy routes are sampled.
+            if status >= 500 or random.random() < rate:
+                access_logger.info(
+                    "%s %s %d", scope["method"], route, status,
+                    extra={
+                        "method": scope["method"],
+                        "route": route,
+                        "status": status,
+                        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                        "sample_rate": rate,
+                    }
+                )
+            request_id.reset(token)
+
+
+class UpdateLogContext(BaseMiddleware):
+    # Updates are handled by queue workers after the webhook request has
+    # returned, so they are correlated by update id instead.
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        token = request_id.set(f"update-{event.update_id}" if isinstance(event, Update) else None)
+        try:
+            return await handler(event, data)
+        finally:
+            request_id.reset(token)
@@ -0,0 +1,212 @@
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, Type
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from tortoise import BaseDBAsyncClient, connections
+
+
+QUERY_METHODS = ("execute_query", "execute_query_dict", "execute_insert", "execute_many", "execute_script")
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RequestStats:
+    started: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    db_time: float = 0.0
+    serialize_time: float = 0.0
+
+    def server_timing(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        return (
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries", '
+            f"serialize;dur={self.serialize_time * 1000:.2f}, "
+            f"app;dur={elapsed * 1000:.2f}"
+        )
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+# Set while a query runs so a client method delegating to another one, or a
+# transaction wrapper calling its parent, is only counted once.
+_in_query: ContextVar[bool] = ContextVar("in_query", default=False)
+
+
+def add_serialize_time(seconds: float) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.serialize_time += seconds
+
+
+def _timed_query(method: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    @wraps(method)
+    async def wrapper(self: BaseDBAsyncClient, *args: Any, **kwargs: Any) -> Any:
+        stats = _current.get()
+        if stats is None or _in_query.get():
+            return await method(self, *args, **kwargs)
+
+        token = _in_query.set(True)
+        started = time.perf_counter()
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            stats.queries += 1
+            stats.db_time += time.perf_counter() - started
+            _in_query.reset(token)
+
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _client_classes(client_class: Type[BaseDBAsyncClient]) -> Set[type]:
+    # Transaction wrappers subclass the client and may override query methods.
+    found = {cls for cls in client_class.__mro__ if issubclass(cls, BaseDBAsyncClient)}
+    pending = [client_class]
+    while pending:
+        for subclass in pending.pop().__subclasses__():
+            if subclass not in found:
+                found.add(subclass)
+                pending.append(subclass)
+    return found
+
+
+def instrument_queries() -> None:
+    for connection in connections.all():
+        for cls in _client_classes(type(connection)):
+            for name in QUERY_METHODS:
+                method = cls.__dict__.get(name)
+                if method is not None and not getattr(method, "instrumented", False):
+                    setattr(cls, name, _timed_query(method))
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name: str, labels: str) -> Iterable[str]:
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {total}'
+        total += self.counts[-1]
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {total}'
+        yield f"{name}_sum{{{labels}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels}}} {total}"
+
+
+@dataclass
+class RouteMetrics:
+    statuses: Dict[int, int] = field(default_factory=dict)
+    duration: Histogram = field(default_factory=lambda: Histogram(DURATION_BUCKETS))
+    queries: Histogram = field(default_factory=lambda: Histogram(QUERY_BUCKETS))
+    db_time: float = 0.0
+    serialize_time: float = 0.0
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+
+    def observe(self, method: str, route: str, status: int, stats: RequestStats, elapsed: float) -> None:
+        route_metrics = self.routes.get((method, route))
+        if route_metrics is None:
+            route_metrics = self.routes[(method, route)] = RouteMetrics()
+        route_metrics.statuses[status] = route_metrics.statuses.get(status, 0) + 1
+        route_metrics.duration.observe(elapsed)
+        route_metrics.queries.observe(stats.queries)
+        route_metrics.db_time += stats.db_time
+        route_metrics.serialize_time += stats.serialize_time
+
+    def render(self) -> str:
+        lines: List[str] = []
+        families = (
+            ("http_requests_total", "counter", "Requests handled, by route and status."),
+            ("http_request_duration_seconds", "histogram", "Time spent handling the request."),
+            ("db_queries_per_request", "histogram", "Database queries issued per request."),
+            ("db_query_seconds_total", "counter", "Time spent waiting for database queries."),
+            ("response_serialization_seconds_total", "counter", "Time spent encoding JSON responses."),
+        )
+        for name, kind, description in families:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (method, route), route_metrics in sorted(self.routes.items()):
+                labels = f'method="{method}",route="{route}"'
+                if name == "http_requests_total":
+                    for status, count in sorted(route_metrics.statuses.items()):
+                        lines.append(f'{name}{{{labels},status="{status}"}} {count}')
+                elif name == "http_request_duration_seconds":
+                    lines.extend(route_metrics.duration.samples(name, labels))
+                elif name == "db_queries_per_request":
+                    lines.extend(route_metrics.queries.samples(name, labels))
+                elif name == "db_query_seconds_total":
+                    lines.append(f"{name}{{{labels}}} {route_metrics.db_time:.6f}")
+                else:
+                    lines.append(f"{name}{{{labels}}} {route_metrics.serialize_time:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        registry: Optional[MetricsRegistry] = None,
+        server_timing: bool = False,
+        query_threshold: int = 0
+    ) -> None:
+        self.app = app
+        self.registry = registry or metrics
+        self.server_timing = server_timing
+        self.query_threshold = query_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", stats.server_timing())
+                    # Browsers hide cross-origin timings without this.
+                    headers.append("Timing-Allow-Origin", "*")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - stats.started
+            # The router stores the matched route in the scope, which keeps
+            # path parameters out of the label set.
+            route = getattr(scope.get("route"), "path", "unmatched")
+            self.registry.observe(scope["method"], route, status, stats, elapsed)
+            if self.query_threshold and stats.queries > self.query_threshold:
+                logger.warning(
+                    "%s %s issued %d queries (threshold %d), db %.1fms of %.1fms",
+                    scope["method"], route, stats.queries, self.query_threshold,
+                    stats.db_time * 1000, elapsed * 1000
+                )
+
+
+metrics = MetricsRegistry()
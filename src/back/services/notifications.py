@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+
+COALESCE_MAX_LINES = 5
+TEXT_MAX_LENGTH = 4096
+RETRY_BACKOFF_MAX = 60.0
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, until: float) -> None:
+        self.paused_until = max(self.paused_until, until)
+        self.updated = self.paused_until
+        self.tokens = 0.0
+
+
+@dataclass
+class PendingBatch:
+    texts: List[str] = field(default_factory=list)
+    total: int = 0
+    attempts: int = 0
+
+    def add(self, text: str) -> None:
+        if len(self.texts) < COALESCE_MAX_LINES:
+            self.texts.append(text)
+        self.total += 1
+
+    def merge(self, newer: "PendingBatch") -> None:
+        for text in newer.texts:
+            self.add(text)
+        self.total += newer.total - len(newer.texts)
+
+    def render(self) -> str:
+        if self.total == 1:
+            return self.texts[0][:TEXT_MAX_LENGTH]
+        lines = [f"У вас {self.total} новых уведомлений:"]
+        lines.extend(f"• {text}" for text in self.texts)
+        if self.total > len(self.texts):
+            lines.append(f"…и ещё {self.total - len(self.texts)}")
+        return "\n".join(lines)[:TEXT_MAX_LENGTH]
+
+
+class Notifier:
+    # Telegram allows about 30 messages per second overall and one per second
+    # to the same chat. Notifications for a user that is still rate limited
+    # accumulate and go out as one message.
+    def __init__(
+        self,
+        global_rate: float = 25.0,
+        chat_interval: float = 1.0,
+        concurrency: int = 4,
+        max_pending: int = 10000,
+        max_attempts: int = 5
+    ) -> None:
+        self.global_rate = global_rate
+        self.chat_interval = chat_interval
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.sent = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.dropped = 0
+        self.failed = 0
+        self._bot: Optional[Bot] = None
+        self._pending: "OrderedDict[int, PendingBatch]" = OrderedDict()
+        self._next_at: Dict[int, float] = {}
+        self._in_flight: Set[int] = set()
+        self._sending: Set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._bucket = TokenBucket(global_rate)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self, user_id: int, text: str) -> bool:
+        if self._task is None:
+            return False
+        batch = self._pending.get(user_id)
+        if batch is None:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            batch = self._pending[user_id] = PendingBatch()
+        batch.add(text)
+        self._wakeup.set()
+        return True
+
+    async def start(
+        self,
+        bot: Bot,
+        global_rate: Optional[float] = None,
+        chat_interval: Optional[float] = None,
+        concurrency: Optional[int] = None,
+        max_pending: Optional[int] = None
+    ) -> None:
+        if global_rate is not None:
+            self.global_rate = global_rate
+            self._bucket = TokenBucket(global_rate)
+        if chat_interval is not None:
+            self.chat_interval = chat_interval
+        if concurrency is not None:
+            self.concurrency = concurrency
+        if max_pending is not None:
+            self.max_pending = max_pending
+        if self._task is None:
+            self._bot = bot
+            self._slots = asyncio.Semaphore(max(self.concurrency, 1))
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        if self._task is None:
+            return
+
+        deadline = time.monotonic() + timeout
+        while (self._pending or self._sending) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        self._task.cancel()
+        for task in list(self._sending):
+            task.cancel()
+        await asyncio.gather(self._task, *self._sending, return_exceptions=True)
+        self._task = None
+        self.dropped += sum(batch.total for batch in self._pending.values())
+        self._pending.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": sum(batch.total for batch in self._pending.values()),
+            "in_flight": len(self._in_flight),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def _next_ready(self, now: float) -> Tuple[Optional[int], Optional[float]]:
+        wait: Optional[float] = None
+        for user_id in self._pending:
+            if user_id in self._in_flight:
+                continue
+            ready_at = self._next_at.get(user_id, 0.0)
+            if ready_at <= now:
+                return user_id, None
+            wait = ready_at - now if wait is None else min(wait, ready_at - now)
+        return None, wait
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            user_id, wait = self._next_ready(now)
+            if user_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            delay = self._bucket.delay(now)
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+
+            await self._slots.acquire()
+            now = time.monotonic()
+            self._bucket.take(now)
+            batch = self._pending.pop(user_id)
+            self._in_flight.add(user_id)
+            self._next_at[user_id] = now + self.chat_interval
+            self._prune(now)
+
+            task = asyncio.create_task(self._deliver(user_id, batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    def _prune(self, now: float) -> None:
+        if len(self._next_at) > self.max_pending:
+            self._next_at = {user_id: at for user_id, at in self._next_at.items() if at > now}
+
+    def _requeue(self, user_id: int, batch: PendingBatch, ready_at: float) -> None:
+        newer = self._pending.pop(user_id, None)
+        if newer is not None:
+            batch.merge(newer)
+        self._pending[user_id] = batch
+        self._pending.move_to_end(user_id, last=False)
+        self._next_at[user_id] = max(self._next_at.get(user_id, 0.0), ready_at)
+
+    async def _deliver(self, user_id: int, batch: PendingBatch) -> None:
+        try:
+            await self._bot.send_message(user_id, batch.render())
+            self.sent += 1
+            self.coalesced += batch.total - 1
+        except TelegramRetryAfter as e:
+            # Flood control applies to the whole bot, not just this chat.
+            ready_at = time.monotonic() + e.retry_after
+            self._bucket.pause(ready_at)
+            self.retried += 1
+            self._requeue(user_id, batch, ready_at)
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Blocked the bot or never started it; retrying will not help.
+            self.dropped += batch.total
+            logger.info("Dropped notification for %s: %s", user_id, e)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            batch.attempts += 1
+            if batch.attempts >= self.max_attempts:
+                self.failed += batch.total
+                logger.warning("Giving up on notification for %s after %d attempts: %s", user_id, batch.attempts, e)
+            else:
+                self.retried += 1
+                backoff = min(2 ** batch.attempts, RETRY_BACKOFF_MAX)
+                self._requeue(user_id, batch, time.monotonic() + backoff)
+        except Exception:
+            self.failed += batch.total
+            logger.exception("Failed to send notification to %s", user_id)
+        finally:
+            self._in_flight.discard(user_id)
+            self._slots.release()
+            self._wakeup.set()
+
+
+notifier = Notifier()
@@ -0,0 +1,40 @@
+import asyncio
+import logging
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    # Calls `tick` every `interval` seconds until stopped. A failed tick is
+    # logged and the loop carries on with the next one.
+    def __init__(self, interval: float = 3600.0) -> None:
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def tick(self) -> None:
+        raise NotImplementedError
+
+    async def start(self, interval: Optional[float] = None) -> None:
+        if interval is not None:
+            self.interval = interval
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("%s failed", type(self).__name__)
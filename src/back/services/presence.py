@@ -0,0 +1,143 @@
+import logging
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from db import UserStatus
+from services.periodic import PeriodicTask
+
+
+PresenceListener = Callable[[int, bool], Awaitable[None]]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Presence:
+    user_id: int
+    user_name: str
+    online: bool
+    last_seen: datetime
+    expires_at: float
+
+
+class PresenceService(PeriodicTask):
+    # The periodic tick expires silent users and flushes changes to the DB.
+    def __init__(self, ttl: float = 60.0, flush_interval: float = 30.0) -> None:
+        super().__init__(flush_interval)
+        self.ttl = ttl
+        self._entries: Dict[int, Presence] = {}
+        self._dirty: Set[int] = set()
+        self._listeners: List[PresenceListener] = []
+
+    def add_listener(self, listener: PresenceListener) -> None:
+        self._listeners.append(listener)
+
+    def _is_live(self, entry: Presence, now: float) -> bool:
+        return entry.online and entry.expires_at > now
+
+    def heartbeat(self, user_id: int, user_name: str, online: bool) -> bool:
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        was_online = entry is not None and self._is_live(entry, now)
+
+        self._entries[user_id] = Presence(
+            user_id=user_id,
+            user_name=user_name,
+            online=online,
+            last_seen=datetime.now(timezone.utc),
+            expires_at=now + self.ttl
+        )
+        self._dirty.add(user_id)
+        return was_online != online
+
+    def get(self, user_id: int) -> Optional[Presence]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        return replace(entry, online=self._is_live(entry, time.monotonic()))
+
+    def is_online(self, user_id: int) -> bool:
+        entry = self._entries.get(user_id)
+        return entry is not None and self._is_live(entry, time.monotonic())
+
+    def lookup(self, user_ids: Iterable[int]) -> Dict[int, bool]:
+        now = time.monotonic()
+        result = {}
+        for user_id in user_ids:
+            entry = self._entries.get(user_id)
+            result[user_id] = entry is not None and self._is_live(entry, now)
+        return result
+
+    async def expire(self) -> List[int]:
+        now = time.monotonic()
+        expired = [
+            user_id for user_id, entry in self._entries.items()
+            if entry.online and entry.expires_at <= now
+        ]
+        for user_id in expired:
+            self._entries[user_id].online = False
+            self._dirty.add(user_id)
+
+        for user_id in expired:
+            await self._notify(user_id, False)
+        return expired
+
+    async def _notify(self, user_id: int, online: bool) -> None:
+        for listener in self._listeners:
+            try:
+                await listener(user_id, online)
+            except Exception:
+                logger.exception("Presence listener failed for %s", user_id)
+
+    async def flush(self) -> int:
+        if not self._dirty:
+            return 0
+
+        dirty, self._dirty = self._dirty, set()
+        statuses = [
+            UserStatus(
+                user_id=entry.user_id,
+                user_name=entry.user_name,
+                online=entry.online,
+                last_seen=entry.last_seen
+            )
+            for entry in (self._entries[user_id] for user_id in dirty)
+        ]
+        try:
+            await UserStatus.bulk_create(
+                statuses,
+                on_conflict=["user_id"],
+                update_fields=["user_name", "online", "last_seen"]
+            )
+        except Exception:
+            self._dirty |= dirty
+            raise
+        return len(statuses)
+
+    def prune(self) -> int:
+        stale = [
+            user_id for user_id, entry in self._entries.items()
+            if not entry.online and user_id not in self._dirty
+        ]
+        for user_id in stale:
+            del self._entries[user_id]
+        return len(stale)
+
+    async def start(self, ttl: Optional[float] = None, flush_interval: Optional[float] = None) -> None:
+        if ttl is not None:
+            self.ttl = ttl
+        await super().start(flush_interval)
+
+    async def stop(self) -> None:
+        await super().stop()
+        await self.flush()
+
+    async def tick(self) -> None:
+        await self.expire()
+        await self.flush()
+        self.prune()
+
+
+presence = PresenceService()
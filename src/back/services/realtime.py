@@ -0,0 +1,193 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from fastapi import WebSocket
+
+from services.serialization import dumps
+
+
+EventHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+logger = logging.getLogger(__name__)
+
+
+class Broker(ABC):
+    @abstractmethod
+    async def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    async def subscribe(self, handler: EventHandler) -> None:
+        ...
+
+    @abstractmethod
+    async def close(self) -> None:
+        ...
+
+
+class InMemoryBroker(Broker):
+    def __init__(self, max_size: int = 10000) -> None:
+        self._queue: asyncio.Queue = asyncio.Queue(max_size)
+        self._handlers: List[EventHandler] = []
+        self._pump: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+    async def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        # Publishing happens on the request path, so it must never wait on
+        # delivery; when the pump falls this far behind the event is lost.
+        try:
+            self._queue.put_nowait((channel, event))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("Event queue full, dropped event for %s", channel)
+
+    async def subscribe(self, handler: EventHandler) -> None:
+        self._handlers.append(handler)
+        if self._pump is None:
+            self._pump = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._pump is not None:
+            self._pump.cancel()
+            try:
+                await self._pump
+            except asyncio.CancelledError:
+                pass
+            self._pump = None
+
+    async def _run(self) -> None:
+        while True:
+            channel, event = await self._queue.get()
+            for handler in self._handlers:
+                try:
+                    await handler(channel, event)
+                except Exception:
+                    logger.exception("Event handler failed for %s", channel)
+
+
+class Connection:
+    # Each socket drains its own bounded queue, so a slow client only ever
+    # delays itself; one that falls too far behind is disconnected.
+    def __init__(self, websocket: WebSocket, max_pending: int, send_timeout: float) -> None:
+        self.websocket = websocket
+        self.send_timeout = send_timeout
+        self._queue: asyncio.Queue = asyncio.Queue(max_pending)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, on_failure: Callable[["Connection"], None]) -> None:
+        self._task = asyncio.create_task(self._run(on_failure))
+
+    def stop(self) -> None:
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        self._task = None
+
+    def offer(self, text: str) -> bool:
+        try:
+            self._queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def close(self, code: int = 1000) -> None:
+        self.stop()
+        try:
+            await self.websocket.close(code)
+        except Exception:
+            # Already closed by the client.
+            pass
+
+    async def _run(self, on_failure: Callable[["Connection"], None]) -> None:
+        try:
+            while True:
+                text = await self._queue.get()
+                await asyncio.wait_for(self.websocket.send_text(text), self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info("Dropping websocket after failed send: %r", e)
+            on_failure(self)
+            await self.close(1011)
+
+
+class Hub:
+    def __init__(self, broker: Broker, max_pending: int = 100, send_timeout: float = 5.0) -> None:
+        self.broker = broker
+        self.max_pending = max_pending
+        self.send_timeout = send_timeout
+        self.slow_disconnects = 0
+        self._connections: Dict[int, Dict[WebSocket, Connection]] = defaultdict(dict)
+        self._closing: Set[asyncio.Task] = set()
+
+    async def start(self, max_pending: Optional[int] = None, send_timeout: Optional[float] = None) -> None:
+        if max_pending is not None:
+            self.max_pending = max_pending
+        if send_timeout is not None:
+            self.send_timeout = send_timeout
+        await self.broker.subscribe(self._deliver)
+
+    async def stop(self) -> None:
+        await self.broker.close()
+        for sockets in list(self._connections.values()):
+            for connection in list(sockets.values()):
+                await connection.close(1001)
+        self._connections.clear()
+        await asyncio.gather(*self._closing, return_exceptions=True)
+
+    async def connect(self, user_id: int, websocket: WebSocket) -> None:
+        # The caller accepts the socket once it has been authenticated.
+        connection = Connection(websocket, self.max_pending, self.send_timeout)
+        connection.start(lambda failed: self.disconnect(user_id, failed.websocket))
+        self._connections[user_id][websocket] = connection
+
+    def disconnect(self, user_id: int, websocket: WebSocket) -> Optional[Connection]:
+        sockets = self._connections.get(user_id)
+        if sockets is None:
+            return None
+        connection = sockets.pop(websocket, None)
+        if not sockets:
+            del self._connections[user_id]
+        if connection is not None:
+            connection.stop()
+        return connection
+
+    def is_connected(self, user_id: int) -> bool:
+        return user_id in self._connections
+
+    async def publish(self, user_id: int, event: Dict[str, Any]) -> None:
+        await self.broker.publish(f"user:{user_id}", event)
+
+    async def publish_many(self, user_ids: Iterable[int], event: Dict[str, Any]) -> None:
+        for user_id in set(user_ids):
+            await self.publish(user_id, event)
+
+    async def _deliver(self, channel: str, event: Dict[str, Any]) -> None:
+        user_id = int(channel.split(":", 1)[1])
+        connections = list(self._connections.get(user_id, {}).values())
+        if not connections:
+            return
+
+        text = dumps(event).decode("utf-8")
+        for connection in connections:
+            if connection.offer(text):
+                continue
+            self.slow_disconnects += 1
+            logger.info("Disconnecting slow websocket consumer of user %s", user_id)
+            self.disconnect(user_id, connection.websocket)
+            task = asyncio.create_task(connection.close(1013))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "users": len(self._connections),
+            "sockets": sum(len(sockets) for sockets in self._connections.values()),
+            "slow_disconnects": self.slow_disconnects,
+            "dropped": getattr(self.broker, "dropped", 0),
+        }
+
+
+hub = Hub(InMemoryBroker())
@@ -0,0 +1,143 @@
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from tortoise import Tortoise
+
+from db import Advert
+from db.routing import read_connection
+from db.search_index import SEARCH_DOCUMENT, SEARCH_INDEX_NAME
+
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_PAGE_MAX = 100
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+SUFFIXES = sorted((
+    "иями", "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими", "ая", "яя", "ое", "ее",
+    "ие", "ые", "ий", "ый", "ой", "ей", "ам", "ям", "ах", "ях", "ом", "ем", "ов", "ев",
+    "ию", "ью", "ия", "ья", "а", "я", "о", "е", "ы", "и", "у", "ю", "ь",
+    "ing", "es", "s",
+), key=len, reverse=True)
+
+PG_DOCUMENT = SEARCH_DOCUMENT
+
+PG_SEARCH_SQL = f"""
+SELECT id, ts_rank({PG_DOCUMENT}, query) AS rank
+FROM adverts, plainto_tsquery('russian', $1) AS query
+WHERE {PG_DOCUMENT} @@ query
+ORDER BY rank DESC, id DESC
+LIMIT $2 OFFSET $3
+"""
+
+
+def stem(token: str) -> str:
+    for suffix in SUFFIXES:
+        if len(token) - len(suffix) >= 3 and token.endswith(suffix):
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(token) for token in TOKEN_RE.findall(text.lower())]
+
+
+class InvertedIndex:
+    def __init__(self) -> None:
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._documents: Dict[int, Tuple[str, ...]] = {}
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, advert_id: int, title: str, description: str) -> None:
+        self.remove(advert_id)
+        terms = Counter(tokenize(f"{title} {description}"))
+        for term, frequency in terms.items():
+            self._postings[term][advert_id] = frequency
+        self._documents[advert_id] = tuple(terms)
+
+    def remove(self, advert_id: int) -> None:
+        for term in self._documents.pop(advert_id, ()):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(advert_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def search(self, text: str) -> List[int]:
+        terms = set(tokenize(text))
+        if not terms:
+            return []
+
+        total = len(self._documents)
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, Set[str]] = defaultdict(set)
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + total / len(postings))
+            for advert_id, frequency in postings.items():
+                scores[advert_id] += (1 + math.log(frequency)) * idf
+                matched[advert_id].add(term)
+
+        return sorted(scores, key=lambda advert_id: (-len(matched[advert_id]), -scores[advert_id], -advert_id))
+
+
+class AdvertSearch:
+    def __init__(self) -> None:
+        self.fallback = InvertedIndex()
+        self._postgres: Optional[bool] = None
+
+    def uses_postgres(self) -> bool:
+        if self._postgres is None:
+            connection = Tortoise.get_connection("default")
+            self._postgres = connection.capabilities.dialect == "postgres"
+        return self._postgres
+
+    async def prepare(self) -> None:
+        if not self.uses_postgres():
+            return
+        rows = await Tortoise.get_connection("default").execute_query_dict(
+            "SELECT 1 FROM pg_indexes WHERE tablename = 'adverts' AND indexname = $1", [SEARCH_INDEX_NAME]
+        )
+        if not rows:
+            logger.warning("%s is missing, search scans adverts; run python -m db.search_index", SEARCH_INDEX_NAME)
+
+    async def _load_fallback(self) -> None:
+        rows = await Advert.all().values_list("id", "title", "description")
+        for advert_id, title, description in rows:
+            self.fallback.add(advert_id, title, description)
+        self.fallback.loaded = True
+
+    def index(self, advert: Advert) -> None:
+        if self.fallback.loaded:
+            self.fallback.add(advert.id, advert.title, advert.description)
+
+    def unindex(self, advert_id: int) -> None:
+        if self.fallback.loaded:
+            self.fallback.remove(advert_id)
+
+    async def search(self, text: str, offset: int, limit: int) -> Tuple[List[int], bool]:
+        if self.uses_postgres():
+            rows = await read_connection().execute_query_dict(
+                PG_SEARCH_SQL, [text, limit + 1, offset]
+            )
+            ids = [row["id"] for row in rows]
+        else:
+            if not self.fallback.loaded:
+                await self._load_fallback()
+            ids = self.fallback.search(text)[offset:offset + limit + 1]
+
+        return ids[:limit], len(ids) > limit
+
+
+advert_search = AdvertSearch()
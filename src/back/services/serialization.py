@@ -0,0 +1,78 @@
+import json
+import time
+from datetime import date, datetime
+from operator import attrgetter
+from typing import Any, Dict, Iterable, List, Tuple, Type
+
+from starlette.responses import JSONResponse
+from tortoise.models import Model
+
+from services.metrics import add_serialize_time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def _encode(content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def _encode(content: Any) -> bytes:
+        return json.dumps(
+            content,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+            default=_default
+        ).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def dumps(content: Any) -> bytes:
+    started = time.perf_counter()
+    try:
+        return _encode(content)
+    finally:
+        add_serialize_time(time.perf_counter() - started)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class FieldPlan:
+    def __init__(self, model: Type[Model], exclude: Iterable[str] = ()) -> None:
+        excluded = set(exclude)
+        self.model = model
+        self.fields: Tuple[str, ...] = tuple(
+            name for name in model._meta.fields_db_projection if name not in excluded
+        )
+        if len(self.fields) == 1:
+            single = attrgetter(self.fields[0])
+            self._getter = lambda obj: (single(obj),)
+        else:
+            self._getter = attrgetter(*self.fields)
+
+    def dump(self, obj: Model) -> Dict[str, Any]:
+        return dict(zip(self.fields, self._getter(obj)))
+
+    def dump_many(self, objs: Iterable[Model]) -> List[Dict[str, Any]]:
+        fields = self.fields
+        getter = self._getter
+        return [dict(zip(fields, getter(obj))) for obj in objs]
+
+
+def hhmm(value: datetime) -> str:
+    return f"{value.hour:02d}:{value.minute:02d}"
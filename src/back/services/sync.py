@@ -0,0 +1,137 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from tortoise.expressions import Q
+
+from db import Change, Chat, Message
+from db.routing import use_primary
+from services.periodic import PeriodicTask
+
+
+ADVERT = "advert"
+CHAT = "chat"
+MESSAGE = "message"
+READ = "read"
+
+SYNC_PAGE_SIZE = 500
+SYNC_PAGE_MAX = 2000
+
+
+async def record_change(
+    entity: str,
+    entity_id: int,
+    chat_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    deleted: bool = False
+) -> None:
+    await Change.create(entity=entity, entity_id=entity_id, chat_id=chat_id, user_id=user_id, deleted=deleted)
+
+
+async def record_changes(changes: Iterable[Change]) -> None:
+    changes = list(changes)
+    if changes:
+        await Change.bulk_create(changes)
+
+
+async def record_read(chat_id: int, reader_id: int, up_to_id: Optional[int] = None) -> None:
+    if up_to_id is None:
+        with use_primary():
+            ids = await Message.filter(chat_id=chat_id).order_by("-id").limit(1).values_list("id", flat=True)
+        up_to_id = ids[0] if ids else 0
+    await record_change(READ, up_to_id, chat_id=chat_id, user_id=reader_id)
+
+
+async def latest_change_id() -> int:
+    ids = await Change.all().order_by("-id").limit(1).values_list("id", flat=True)
+    return ids[0] if ids else 0
+
+
+async def oldest_change_id() -> Optional[int]:
+    ids = await Change.all().order_by("id").limit(1).values_list("id", flat=True)
+    return ids[0] if ids else None
+
+
+@dataclass
+class ChangeSet:
+    since: int
+    reset: bool = False
+    has_more: bool = False
+    adverts: List[int] = field(default_factory=list)
+    deleted_adverts: List[int] = field(default_factory=list)
+    chats: List[int] = field(default_factory=list)
+    messages: List[int] = field(default_factory=list)
+    deleted_messages: List[int] = field(default_factory=list)
+    reads: List[Tuple[int, int, int]] = field(default_factory=list)
+    partner_ids: Set[int] = field(default_factory=set)
+
+
+async def collect_changes(user_id: int, since: Optional[int], limit: int, settle: float) -> ChangeSet:
+    # Without a watermark, or with one older than the pruned log, the client
+    # has to do a full reload and then continue from the current head.
+    if since is None:
+        return ChangeSet(since=await latest_change_id(), reset=True)
+    oldest = await oldest_change_id()
+    if oldest is not None and since < oldest - 1:
+        return ChangeSet(since=await latest_change_id(), reset=True)
+
+    memberships = await Chat.filter(Q(user1_id=user_id) | Q(user2_id=user_id)).values_list("id", "user1_id", "user2_id")
+    chat_ids = [chat_id for chat_id, _, _ in memberships]
+
+    # Ids are handed out at insert time but become visible at commit, so the
+    # newest rows are held back briefly to avoid skipping a slower transaction.
+    horizon = datetime.now(timezone.utc) - timedelta(seconds=settle)
+    rows = await (
+        Change.filter(Q(entity=ADVERT) | Q(chat_id__in=chat_ids), id__gt=since, created_at__lte=horizon)
+        .order_by("id")
+        .limit(limit + 1)
+    )
+
+    result = ChangeSet(since=since, has_more=len(rows) > limit)
+    result.partner_ids = {
+        user2_id if user1_id == user_id else user1_id
+        for _, user1_id, user2_id in memberships
+    }
+    latest: Dict[Tuple[str, int], Change] = {}
+    reads: Dict[Tuple[int, int], int] = {}
+    for change in rows[:limit]:
+        result.since = change.id
+        if change.entity == READ:
+            key = (change.chat_id, change.user_id)
+            reads[key] = max(reads.get(key, 0), change.entity_id)
+        else:
+            latest[(change.entity, change.entity_id)] = change
+
+    for (entity, entity_id), change in latest.items():
+        if entity == ADVERT:
+            (result.deleted_adverts if change.deleted else result.adverts).append(entity_id)
+        elif entity == CHAT and not change.deleted:
+            result.chats.append(entity_id)
+        elif entity == MESSAGE:
+            (result.deleted_messages if change.deleted else result.messages).append(entity_id)
+    result.reads = [(chat_id, reader_id, up_to_id) for (chat_id, reader_id), up_to_id in reads.items()]
+    return result
+
+
+async def prune_changes(retention: timedelta) -> int:
+    newest = await latest_change_id()
+    cutoff = datetime.now(timezone.utc) - retention
+    # The newest row always stays so stale watermarks can still be detected.
+    return await Change.filter(created_at__lt=cutoff, id__lt=newest).delete()
+
+
+class ChangeLogPruner(PeriodicTask):
+    def __init__(self, retention_days: float = 7.0, interval: float = 3600.0) -> None:
+        super().__init__(interval)
+        self.retention_days = retention_days
+
+    async def start(self, retention_days: Optional[float] = None, interval: Optional[float] = None) -> None:
+        if retention_days is not None:
+            self.retention_days = retention_days
+        await super().start(interval)
+
+    async def tick(self) -> None:
+        await prune_changes(timedelta(days=self.retention_days))
+
+
+change_pruner = ChangeLogPruner()
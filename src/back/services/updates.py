@@ -0,0 +1,141 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiogram.types import Update
+
+
+UpdateHandler = Callable[[Update], Awaitable[None]]
+
+logger = logging.getLogger(__name__)
+
+
+def ordering_key(update: Update) -> int:
+    try:
+        event = update.event
+    except Exception:
+        return update.update_id
+
+    chat = getattr(event, "chat", None)
+    if chat is None:
+        message = getattr(event, "message", None)
+        chat = getattr(message, "chat", None)
+    if chat is not None:
+        return chat.id
+
+    user = getattr(event, "from_user", None)
+    if user is not None:
+        return user.id
+    return update.update_id
+
+
+class UpdateQueue:
+    def __init__(self, workers: int = 4, max_size: int = 1000, dedup_size: int = 10000) -> None:
+        self.workers = workers
+        self.max_size = max_size
+        self.dedup_size = dedup_size
+        self._handler: Optional[UpdateHandler] = None
+        self._shards: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._accepting = False
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.duplicates = 0
+        self.max_depth = 0
+
+    def depth(self) -> int:
+        return sum(shard.qsize() for shard in self._shards)
+
+    def _remember(self, update_id: int) -> None:
+        self._seen[update_id] = None
+        while len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+
+    def submit(self, update: Update) -> bool:
+        if not self._accepting:
+            return False
+        if update.update_id in self._seen:
+            self.duplicates += 1
+            return True
+
+        shard = self._shards[ordering_key(update) % len(self._shards)]
+        try:
+            shard.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+
+        self._remember(update.update_id)
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self.depth())
+        return True
+
+    async def _run(self, shard: asyncio.Queue) -> None:
+        while True:
+            update = await shard.get()
+            try:
+                await self._handler(update)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Update %s failed", update.update_id)
+            finally:
+                shard.task_done()
+
+    async def start(
+        self,
+        handler: UpdateHandler,
+        workers: Optional[int] = None,
+        max_size: Optional[int] = None
+    ) -> None:
+        if workers is not None:
+            self.workers = workers
+        if max_size is not None:
+            self.max_size = max_size
+        if self._tasks:
+            return
+
+        self._handler = handler
+        count = max(self.workers, 1)
+        shard_size = max(self.max_size // count, 1)
+        self._shards = [asyncio.Queue(shard_size) for _ in range(count)]
+        self._tasks = [asyncio.create_task(self._run(shard)) for shard in self._shards]
+        self._accepting = True
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        self._accepting = False
+        if not self._tasks:
+            return
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(shard.join() for shard in self._shards)),
+                timeout
+            )
+        except asyncio.TimeoutError:
+            pass
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": len(self._tasks),
+            "depth": self.depth(),
+            "max_depth": self.max_depth,
+            "capacity": sum(shard.maxsize for shard in self._shards),
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "duplicates": self.duplicates
+        }
+
+
+update_queue = UpdateQueue()
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useLayoutEffect, useRef } from 'react';
 import { Search, User, Send, ArrowLeft, RefreshCw } from 'lucide-react';
 import { Input } from './ui/input';
 import { Badge } from './ui/badge';
@@ -11,6 +11,8 @@ export function ChatTab() {
     chats,
     selectedChat,
     messages,
+    hasOlderMessages,
+    loadingOlder,
     loading,
     error,
     searchQuery,
@@ -19,10 +21,14 @@ export function ChatTab() {
     searchChats,
     setError,
     loadChats,
-    loadMessages
+    loadMessages,
+    loadOlderMessages
   } = useChat();
 
   const [newMessage, setNewMessage] = useState('');
+  const containerRef = useRef<HTMLDivElement>(null);
+  const lastMessageIdRef = useRef<number | null>(null);
+  const scrollFromBottomRef = useRef<number | null>(null);
 
   const handleRefresh = () => {
     if (selectedChat) {
@@ -44,11 +50,28 @@ export function ChatTab() {
     searchChats(query);
   };
 
-  useEffect(() => {
-    const messagesContainer = document.querySelector('.messages-container');
-    if (messagesContainer) {
-      messagesContainer.scrollTop = messagesContainer.scrollHeight;
+  const handleMessagesScroll = () => {
+    const container = containerRef.current;
+    if (!container || container.scrollTop > 50 || !hasOlderMessages || loadingOlder) return;
+
+    scrollFromBottomRef.current = container.scrollHeight - container.scrollTop;
+    loadOlderMessages();
+  };
+
+  useLayoutEffect(() => {
+    const container = containerRef.current;
+    if (!container) return;
+
+    const lastId = messages.length > 0 ? messages[messages.length - 1].id : null;
+    if (lastId !== lastMessageIdRef.current) {
+      // A new message arrived or another chat was opened.
+      container.scrollTop = container.scrollHeight;
+    } else if (scrollFromBottomRef.current !== null) {
+      // Older messages were prepended; keep the same message in view.
+      container.scrollTop = container.scrollHeight - scrollFromBottomRef.current;
     }
+    lastMessageIdRef.current = lastId;
+    scrollFromBottomRef.current = null;
   }, [messages]);
 
   if (selectedChat) {
@@ -87,7 +110,16 @@ export function ChatTab() {
           </Button>
         </div>
 
-        <div className="flex-1 overflow-y-auto p-4 space-y-4 messages-container">
+        <div
+          ref={containerRef}
+          onScroll={handleMessagesScroll}
+          className="flex-1 overflow-y-auto p-4 space-y-4 messages-container"
+        >
+          {loadingOlder && (
+            <div className="flex justify-center">
+              <div className="text-gray-500">Загрузка...</div>
+            </div>
+          )}
           {messages.length === 0 && !loading ? (
             <div className="text-center text-gray-500 py-8">
               Нет сообщений. Начните диалог!
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import { ArrowLeft, Package, Edit, Trash2, Phone, Search, Plus } from 'lucide-react';
 import { Button } from './ui/button';
 import { Card, CardContent } from './ui/card';
@@ -12,6 +12,29 @@ interface ExtendedListingsTabProps extends ListingsTabProps {
   listingsUpdated?: number;
 }
 
+type ListingSort = 'newest' | 'cheapest';
+
+const ALL_CATEGORIES = 'Все';
+const SORT_LABELS: Record<ListingSort, string> = {
+  newest: 'Новые',
+  cheapest: 'Дешевле'
+};
+
+const toListing = (listing: any): Listing => ({
+  id: listing.id || 0,
+  title: listing.title || 'Без названия',
+  description: listing.description || '',
+  price: listing.price || 0,
+  deposit: listing.deposit || 0,
+  period: listing.period || 'день',
+  category: listing.category || 'Другое',
+  available: listing.available ?? true,
+  owner_id: listing.owner_id || 0,
+  owner_name: listing.owner_name || 'Неизвестный пользователь',
+  created_at: listing.created_at,
+  updated_at: listing.updated_at
+}) as Listing;
+
 export function ListingDetail({
   listing,
   currentUserId,
@@ -153,42 +176,107 @@ export function ListingsTab({
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [searchQuery, setSearchQuery] = useState('');
-  const [selectedCategory, setSelectedCategory] = useState('Все');
+  const [selectedCategory, setSelectedCategory] = useState(ALL_CATEGORIES);
+  const [sort, setSort] = useState<ListingSort>('newest');
+  const [debouncedQuery, setDebouncedQuery] = useState('');
+  const [categories, setCategories] = useState<string[]>([ALL_CATEGORIES]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  // Incremented on every fresh load so late pages of an old filter are dropped.
+  const generationRef = useRef(0);
+
+  const searching = debouncedQuery.trim() !== '';
 
   useEffect(() => {
-    loadListings();
+    const timer = window.setTimeout(() => setDebouncedQuery(searchQuery), 300);
+    return () => clearTimeout(timer);
+  }, [searchQuery]);
+
+  // The catalog is paginated on the server, so categories come from the
+  // facets summary rather than from whatever page is loaded.
+  useEffect(() => {
+    request('advert/facets')
+      .then(response => {
+        const names = (response?.data?.categories || []).map((facet: any) => facet.category);
+        setCategories([ALL_CATEGORIES, ...names]);
+      })
+      .catch(err => console.error('Error loading categories:', err));
   }, [listingsUpdated]);
 
-  const loadListings = async () => {
+  const fetchPage = useCallback(async (cursor: string | null) => {
+    let endpoint: string;
+    if (debouncedQuery.trim()) {
+      const params = new URLSearchParams({ q: debouncedQuery.trim() });
+      if (cursor) params.set('page', cursor);
+      endpoint = `advert/search?${params}`;
+    } else {
+      const params = new URLSearchParams({ sort });
+      if (selectedCategory !== ALL_CATEGORIES) params.set('category', selectedCategory);
+      if (cursor) params.set('cursor', cursor);
+      endpoint = `advert/get/all?${params}`;
+    }
+
+    const response = await request(endpoint);
+    const data = response?.data || {};
+    const next = data.next_cursor ?? (data.next_page != null ? String(data.next_page) : null);
+    return {
+      listings: (data.adverts || []).map(toListing) as Listing[],
+      next: next as string | null
+    };
+  }, [debouncedQuery, selectedCategory, sort]);
+
+  const loadListings = useCallback(async () => {
+    const generation = ++generationRef.current;
     try {
       setLoading(true);
       setError(null);
-      const response = await request("advert/get/all");
-      
-      const listingsData = response?.data?.adverts || [];
-      
-      const safeListings = listingsData.map((listing: any) => ({
-        id: listing.id || 0,
-        title: listing.title || 'Без названия',
-        description: listing.description || '',
-        price: listing.price || 0,
-        deposit: listing.deposit || 0,
-        period: listing.period || 'день',
-        category: listing.category || 'Другое',
-        available: listing.available ?? true,
-        owner_id: listing.owner_id || 0,
-        owner_name: listing.owner_name || 'Неизвестный пользователь',
-        created_at: listing.created_at,
-        updated_at: listing.updated_at
-      })) as Listing[];
-      
-      setListings(safeListings);
+      const page = await fetchPage(null);
+      if (generation !== generationRef.current) return;
+
+      setListings(page.listings);
+      setNextCursor(page.next);
     } catch (err) {
+      if (generation !== generationRef.current) return;
       console.error('Error loading listings:', err);
       setError('Ошибка при загрузке объявлений');
       setListings([]);
+      setNextCursor(null);
+    } finally {
+      if (generation === generationRef.current) {
+        setLoading(false);
+      }
+    }
+  }, [fetchPage]);
+
+  const loadMore = async () => {
+    if (!nextCursor || loading || loadingMore) return;
+
+    const generation = generationRef.current;
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(nextCursor);
+      if (generation !== generationRef.current) return;
+
+      setListings(prev => {
+        const known = new Set(prev.map(listing => listing.id));
+        return [...prev, ...page.listings.filter(listing => !known.has(listing.id))];
+      });
+      setNextCursor(page.next);
+    } catch (err) {
+      console.error('Error loading more listings:', err);
     } finally {
-      setLoading(false);
+      setLoadingMore(false);
+    }
+  };
+
+  useEffect(() => {
+    loadListings();
+  }, [loadListings, listingsUpdated]);
+
+  const handleListScroll = (e: React.UIEvent<HTMLDivElement>) => {
+    const container = e.currentTarget;
+    if (container.scrollHeight - container.scrollTop - container.clientHeight < 300) {
+      loadMore();
     }
   };
 
@@ -252,22 +340,11 @@ export function ListingsTab({
     onEditListing(listing);
   };
 
-  const filteredListings = listings.filter(listing => {
-    const searchLower = searchQuery.toLowerCase();
-    const matchesSearch = 
-      listing.title.toLowerCase().includes(searchLower) ||
-      listing.description.toLowerCase().includes(searchLower);
-    
-    const matchesCategory = selectedCategory === 'Все' || listing.category === selectedCategory;
-    
-    return matchesSearch && matchesCategory;
-  });
-
-  const categories = ['Все', ...Array.from(new Set(
-    listings
-      .map(listing => listing.category)
-      .filter(Boolean)
-  ))];
+  // The catalog endpoint filters by category itself; search results are
+  // ranked by relevance and narrowed to the category here.
+  const filteredListings = searching && selectedCategory !== ALL_CATEGORIES
+    ? listings.filter(listing => listing.category === selectedCategory)
+    : listings;
 
   if (viewMode === 'detail' && selectedListing) {
     return (
@@ -310,9 +387,24 @@ export function ListingsTab({
             </Badge>
           ))}
         </div>
+
+        {!searching && (
+          <div className="flex gap-2 pt-1">
+            {(Object.keys(SORT_LABELS) as ListingSort[]).map(option => (
+              <Badge
+                key={option}
+                variant={sort === option ? "default" : "outline"}
+                className="rounded-full whitespace-nowrap cursor-pointer"
+                onClick={() => setSort(option)}
+              >
+                {SORT_LABELS[option]}
+              </Badge>
+            ))}
+          </div>
+        )}
       </div>
 
-      <div className="flex-1 overflow-y-auto p-4">
+      <div className="flex-1 overflow-y-auto p-4" onScroll={handleListScroll}>
         {loading ? (
           <div className="flex justify-center items-center h-32">
             <div className="text-gray-500">Загрузка объявлений...</div>
@@ -327,12 +419,12 @@ export function ListingsTab({
         ) : filteredListings.length === 0 ? (
           <div className="flex flex-col items-center justify-center h-32 text-gray-500 space-y-2">
             <div>Объявления не найдены</div>
-            {(searchQuery || selectedCategory !== 'Все') && (
+            {(searchQuery || selectedCategory !== ALL_CATEGORIES) && (
               <Button 
                 variant="outline" 
                 onClick={() => { 
                   setSearchQuery(''); 
-                  setSelectedCategory('Все'); 
+                  setSelectedCategory(ALL_CATEGORIES); 
                 }}
               >
                 Сбросить поиск
@@ -377,6 +469,11 @@ export function ListingsTab({
                 </CardContent>
               </Card>
             ))}
+            {loadingMore && (
+              <div className="col-span-2 flex justify-center py-2">
+                <div className="text-gray-500">Загрузка...</div>
+              </div>
+            )}
           </div>
         )}
       </div>
@@ -7,6 +7,8 @@ export const useChat = () => {
   const [chats, setChats] = useState<FrontendChat[]>([]);
   const [selectedChat, setSelectedChat] = useState<FrontendChat | null>(null);
   const [messages, setMessages] = useState<FrontendMessage[]>([]);
+  const [hasOlderMessages, setHasOlderMessages] = useState(false);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [searchQuery, setSearchQuery] = useState('');
@@ -82,7 +84,17 @@ export const useChat = () => {
       
       if (response.success && response.data) {
         const transformedMessages = response.data.messages.map(transformMessage);
-        setMessages(transformedMessages);
+        const hasMore = response.data.has_more;
+        const current = messagesRef.current;
+        const sameChat = current.length > 0 && current[0].chatId === chatId;
+        const oldestLatest = transformedMessages.length > 0 ? transformedMessages[0].id : Infinity;
+        // Polling only refreshes the newest page; keep whatever older
+        // history was already scrolled in for this chat.
+        const older = sameChat ? current.filter(m => m.id < oldestLatest) : [];
+        setMessages([...older, ...transformedMessages]);
+        if (older.length === 0) {
+          setHasOlderMessages(hasMore);
+        }
         
         setChats(prevChats => 
           prevChats.map(c => 
@@ -95,10 +107,35 @@ export const useChat = () => {
     }
   }, [user?.id]);
 
+  const loadOlderMessages = useCallback(async () => {
+    const chat = selectedChatRef.current;
+    const oldest = messagesRef.current[0];
+    if (!user?.id || !chat || !oldest || !hasOlderMessages || loadingOlder) return;
+
+    setLoadingOlder(true);
+    try {
+      const response = await chatApi.getChatMessages(chat.id, user.id, oldest.id);
+
+      if (response.success && response.data && selectedChatRef.current?.id === chat.id) {
+        const olderMessages = response.data.messages.map(transformMessage);
+        setMessages(prev => [
+          ...olderMessages.filter(m => m.id < (prev[0]?.id ?? Infinity)),
+          ...prev
+        ]);
+        setHasOlderMessages(response.data.has_more);
+      }
+    } catch (err) {
+      console.error('Error loading older messages:', err);
+    } finally {
+      setLoadingOlder(false);
+    }
+  }, [user?.id, hasOlderMessages, loadingOlder]);
+
   const selectChat = useCallback(async (chat: FrontendChat | null) => {
     if (!chat) {
       setSelectedChat(null);
       setMessages([]);
+      setHasOlderMessages(false);
       if (messagesIntervalRef.current) {
         clearInterval(messagesIntervalRef.current);
         messagesIntervalRef.current = null;
@@ -107,6 +144,8 @@ export const useChat = () => {
     }
 
     setSelectedChat(chat);
+    setMessages([]);
+    setHasOlderMessages(false);
     setLoading(true);
     setError(null);
 
@@ -273,6 +312,8 @@ export const useChat = () => {
     chats,
     selectedChat,
     messages,
+    hasOlderMessages,
+    loadingOlder,
     loading: loading || userLoading,
     error,
     searchQuery,
@@ -283,6 +324,7 @@ export const useChat = () => {
     updateOnlineStatus,
     loadChats,
     loadMessages,
+    loadOlderMessages,
     stopAllPolling,
     startChatsPolling,
     startMessagesPolling
@@ -28,7 +28,9 @@ const transformBackendResponse = <T>(backendResponse: any): ApiResponse<T> => {
       return {
         success: true,
         data: {
-          messages: backendResponse.messages
+          messages: backendResponse.messages,
+          next_cursor: backendResponse.next_cursor,
+          has_more: backendResponse.has_more
         } as T
       };
     }
@@ -82,12 +84,17 @@ export const getChats = async (userId: number): Promise<ApiResponse<{ chats: Cha
 };
 
 
-export const getChatMessages = async (chatId: number, userId: number): Promise<ApiResponse<{ messages: Message[] }>> => {
+export const getChatMessages = async (
+  chatId: number,
+  userId: number,
+  beforeId?: number
+): Promise<ApiResponse<{ messages: Message[]; next_cursor: number | null; has_more: boolean }>> => {
   try {
-    const response = await request(`chats/${chatId}/messages/${userId}`, 'GET');
+    const cursor = beforeId !== undefined ? `?before_id=${beforeId}` : '';
+    const response = await request(`chats/${chatId}/messages/${userId}${cursor}`, 'GET');
     console.log('Raw getChatMessages response:', response.data);
     
-    return transformBackendResponse<{ messages: Message[] }>(response.data);
+    return transformBackendResponse<{ messages: Message[]; next_cursor: number | null; has_more: boolean }>(response.data);
   } catch (error: any) {
     return {
       success: false,